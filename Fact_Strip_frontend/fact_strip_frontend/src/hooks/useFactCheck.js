@@ -6,6 +6,9 @@ import axios from 'axios';
 // ✅ Your Flask backend URL
 const API_BASE_URL = 'http://128.10.44.102:5000';
 
+// Panels come back as /api/images/<hash> links served by the backend
+const resolveImageUrl = (src) => (src && src.startsWith('/') ? `${API_BASE_URL}${src}` : src);
+
 export const useFactCheck = () => {
   const [result, setResult] = useState(null);
   const [error, setError] = useState(null);
@@ -38,6 +41,7 @@ export const useFactCheck = () => {
         moodConfidence: response.data.mood_confidence, // Backend sends 'mood_confidence', frontend expects 'moodConfidence'
         // Include all other backend fields as-is
         ...response.data,
+        panel_images: (response.data.panel_images || []).map(resolveImageUrl),
       };
 
       setResult(resultData);
@@ -0,0 +1,260 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import metrics, log
+
+
+class AdmissionRejected(Exception):
+    """A request turned away at the door, with the status and Retry-After to send"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Spend a token, returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class Ticket:
+    """One request's place in line: queued -> active / text_only -> done"""
+
+    def __init__(self, controller, priority, deadline, state):
+        self.controller = controller
+        self.priority = priority
+        self.deadline = deadline
+        self.state = state
+        self.admitted_at = time.monotonic() if state == "active" else None
+        self._admitted = threading.Event()
+
+    @property
+    def text_only(self):
+        return self.state == "text_only"
+
+    def wait(self):
+        """Block until admitted, returns True if the request should be answered text-only"""
+        if self.state == "queued":
+            self._admitted.wait(max(0, self.deadline - time.monotonic()))
+            self.controller._expire(self)
+        return self.text_only
+
+    async def wait_async(self):
+        """wait() for the event loop, polls instead of holding a thread while queued"""
+        while self.state == "queued" and not self._admitted.is_set() and time.monotonic() < self.deadline:
+            await asyncio.sleep(0.05)
+        if self.state == "queued":
+            self.controller._expire(self)
+        return self.text_only
+
+    def release(self):
+        self.controller._release(self)
+
+
+class AdmissionController:
+    """Bounded, prioritized admission in front of the pipeline.
+
+    Up to max_active requests run with full comics. Later ones wait in a queue,
+    interactive ahead of batch, until a slot frees up or their queue deadline
+    passes. Past the deadline, or when the queue is full, they are answered
+    text-only with fallback panels (no Replicate calls), up to max_text_only at
+    a time; beyond that they get a 503 with Retry-After. Each client also has
+    a token bucket, an empty bucket means 429.
+    """
+
+    priorities = {"interactive": 0, "batch": 1}
+
+    def __init__(self, max_active=8, max_queued=32, max_text_only=16, queue_timeouts=None,
+                 client_rate=2.0, client_burst=20, max_clients=10000):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.max_text_only = max_text_only
+        self.queue_timeouts = queue_timeouts or {"interactive": 10.0, "batch": 120.0}
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.active = 0
+        self.text_only = 0
+        self.queued = {priority: 0 for priority in self.priorities}
+        self._waiting = []  # heap of (priority rank, seq, ticket), tickets that left are skipped lazily
+        self._seq = itertools.count()
+        self._buckets = {}
+        self._service_seconds = 10.0  # moving average of how long a full request holds its slot
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_active > 0
+
+    @property
+    def capacity(self):
+        """Requests that can be in the building at once (running, queued or text-only)"""
+        return self.max_active + self.max_queued + self.max_text_only if self.enabled else 0
+
+    def check_rate(self, client, priority="interactive"):
+        """Take a token from the client's bucket, raises AdmissionRejected (429) if it's empty"""
+        if not self.client_rate or client is None:
+            return
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._prune_buckets()
+                bucket = self._buckets[client] = TokenBucket(self.client_rate, self.client_burst)
+            wait = bucket.take()
+        if wait:
+            metrics.admissions.inc(priority=priority, outcome="rate_limited")
+            raise AdmissionRejected("Too many requests", 429, math.ceil(wait))
+
+    def reserve(self, client=None, priority="interactive"):
+        """Claim a place for one request, returns a Ticket or raises AdmissionRejected"""
+        priority = priority if priority in self.priorities else "interactive"
+        self.check_rate(client, priority)
+        deadline = time.monotonic() + self.queue_timeouts.get(priority, 10.0)
+        if not self.enabled:
+            return Ticket(self, priority, deadline, "unlimited")
+
+        with self._lock:
+            if self.active < self.max_active and not any(self.queued.values()):
+                self.active += 1
+                state = "active"
+            elif sum(self.queued.values()) < self.max_queued or self._displace(priority):
+                state = "queued"
+            elif self.text_only < self.max_text_only:
+                self.text_only += 1
+                state = "text_only"
+            else:
+                metrics.admissions.inc(priority=priority, outcome="rejected")
+                raise AdmissionRejected("Server is overloaded, try again shortly", 503, self._retry_after())
+
+            ticket = Ticket(self, priority, deadline, state)
+            if state == "queued":
+                self.queued[priority] += 1
+                heapq.heappush(self._waiting, (self.priorities[priority], next(self._seq), ticket))
+        metrics.admissions.inc(priority=priority, outcome=state)
+        if state == "text_only":
+            log("🚦 Queue is full, answering text-only")
+        return ticket
+
+    @contextmanager
+    def admit(self, priority="interactive"):
+        """Hold a place for the block (waiting in line if needed), yields True if it should answer text-only"""
+        ticket = self.reserve(priority=priority)
+        try:
+            yield ticket.wait()
+        finally:
+            ticket.release()
+
+    @asynccontextmanager
+    async def admit_async(self, priority="interactive"):
+        """admit() for the event loop"""
+        ticket = self.reserve(priority=priority)
+        try:
+            yield await ticket.wait_async()
+        finally:
+            ticket.release()
+
+    def _displace(self, priority):
+        """Make room for a more urgent request by sending the newest, least urgent one text-only"""
+        rank = self.priorities[priority]
+        queued = [entry for entry in self._waiting if entry[2].state == "queued" and entry[0] > rank]
+        if not queued:
+            return False
+        _, _, ticket = max(queued, key=lambda entry: (entry[0], entry[1]))
+        self.queued[ticket.priority] -= 1
+        self.text_only += 1
+        ticket.state = "text_only"
+        ticket._admitted.set()
+        metrics.admissions.inc(priority=ticket.priority, outcome="displaced")
+        return True
+
+    def _expire(self, ticket):
+        """Called after a queued ticket's wait: past its deadline it goes text-only"""
+        with self._lock:
+            if ticket.state != "queued":
+                return
+            self.queued[ticket.priority] -= 1
+            self.text_only += 1
+            ticket.state = "text_only"
+        metrics.admissions.inc(priority=ticket.priority, outcome="expired")
+        log("🚦 Waited past the queue deadline, answering text-only")
+
+    def _release(self, ticket):
+        with self._lock:
+            if ticket.state == "active":
+                held = time.monotonic() - ticket.admitted_at
+                self._service_seconds += 0.1 * (held - self._service_seconds)
+                self.active -= 1
+                self._admit_next()
+            elif ticket.state == "text_only":
+                self.text_only -= 1
+            ticket.state = "done"
+
+    def _admit_next(self):
+        while self._waiting and self.active < self.max_active:
+            _, _, ticket = heapq.heappop(self._waiting)
+            if ticket.state != "queued":
+                continue
+            self.queued[ticket.priority] -= 1
+            self.active += 1
+            ticket.state = "active"
+            ticket.admitted_at = time.monotonic()
+            ticket._admitted.set()
+
+    def _retry_after(self):
+        """Seconds until the current queue should have drained"""
+        backlog = self.active + sum(self.queued.values())
+        return max(1, math.ceil(self._service_seconds * backlog / self.max_active))
+
+    def _prune_buckets(self):
+        """Forget clients whose buckets have refilled, they'd start full anyway"""
+        now = time.monotonic()
+        full = [client for client, bucket in self._buckets.items()
+                if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.burst]
+        for client in full:
+            del self._buckets[client]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "active": self.active,
+                "max_active": self.max_active,
+                "queued": dict(self.queued),
+                "text_only": self.text_only
+            }
+
+
+# Create global instance
+admission = AdmissionController(
+    max_active=int(os.getenv("ADMISSION_MAX_ACTIVE", "8")),
+    max_queued=int(os.getenv("ADMISSION_MAX_QUEUED", "32")),
+    max_text_only=int(os.getenv("ADMISSION_MAX_TEXT_ONLY", "16")),
+    queue_timeouts={
+        "interactive": float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+        "batch": float(os.getenv("ADMISSION_BATCH_QUEUE_TIMEOUT", "120"))
+    },
+    client_rate=float(os.getenv("ADMISSION_CLIENT_RATE", "2")),
+    client_burst=float(os.getenv("ADMISSION_CLIENT_BURST", "20"))
+)
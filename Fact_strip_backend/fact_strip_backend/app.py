@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_from_directory, abort
 from dotenv import load_dotenv
 import openai
 import replicate
@@ -10,14 +10,26 @@ import base64
 from io import BytesIO
 from PIL import Image
 
-# Import our comic generator
-from comic_generator import comic_generator
-from story_processor import story_processor
-
 # --- Load Environment Variables ---
-load_dotenv()  # This will load your .env file
+load_dotenv()  # This will load your .env file (before our modules read their settings)
+
+# Import our fact-check + comic pipeline
+from job_queue import job_manager
+from admission import admission, AdmissionRejected
+from image_store import image_store
+from batch_processor import batch_processor
+from circuit_breaker import circuit_breakers
+from metrics import metrics, start_request, current_request_id, log
+from result_cache import result_cache
+from history_store import history_store
+from claim_index import claim_index
+from panel_cache import panel_cache
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+GENERATE_WAIT_TIMEOUT = float(os.getenv("GENERATE_WAIT_TIMEOUT", "120"))  # seconds, then answer with the job
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "100"))
 
 # --- Initialize the Flask app ---
 app = Flask(__name__)
@@ -27,83 +39,52 @@ CORS(app)  # Enable React connection
 openai.api_key = OPENAI_API_KEY
 os.environ["REPLICATE_API_TOKEN"] = REPLICATE_API_TOKEN
 
-# --- Enhanced AI Analysis Functions ---
-def analyze_statement(statement):
-    """Use OpenAI GPT for fact-checking analysis"""
-    try:
-        print(f"🔍 Analyzing statement with OpenAI: {statement}")
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": """You are a professional fact-checker. Analyze statements and return ONLY valid JSON:
-                {
-                    "verdict": "true/false/unverified",
-                    "confidence": 0-100,
-                    "description": "brief factual explanation",
-                    "story": "engaging story for comic panels"
-                }"""},
-                {"role": "user", "content": f"Fact-check: \"{statement}\""}
-            ],
-            temperature=0.3,
-            max_tokens=400
-        )
-        
-        result = response.choices[0].message.content.strip()
-        print(f"✅ OpenAI Response: {result}")
-        return result
-        
-    except Exception as e:
-        print(f"❌ OpenAI API error: {e}")
-        # Fallback response
-        return json.dumps({
-            "verdict": "unverified",
-            "confidence": 50,
-            "description": "Unable to verify at this time.",
-            "story": f"Let's explore the statement: '{statement}'. We're checking facts and sources to determine the truth."
-        })
-
-
-def detect_mood(statement):
-    """Use OpenAI for mood detection"""
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Analyze mood. Return JSON: {\"mood\": \"neutral/positive/negative/serious\", \"confidence\": 0-100}"},
-                {"role": "user", "content": f"Statement: \"{statement}\""}
-            ],
-            temperature=0.1,
-            max_tokens=80
-        )
-        
-        mood_data = json.loads(response.choices[0].message.content.strip())
-        return mood_data.get("mood", "neutral"), mood_data.get("confidence", 75)
-        
-    except Exception as e:
-        print(f"❌ Mood detection error: {e}")
-        return "neutral", 75
+# --- Request ids and metrics ---
+@app.before_request
+def assign_request_id():
+    start_request(request.headers.get("X-Request-ID"))
 
 
-def generate_comic(story, style, verdict, confidence, statement):
-    """Generate a complete 4-panel comic with separate images"""
-    try:
-        # Split into 4 panels with actual dialogue
-        panels = story_processor.split_into_panels(statement, verdict, confidence, story)
-        print(f"📝 Generated panel dialogues: {panels}")
-        
-        # Generate 4 separate panel images
-        panel_images = comic_generator.generate_comic_panels(style, panels, statement)
-        
-        # Return all 4 panel images
-        return panel_images
-        
-    except Exception as e:
-        print(f"❌ Comic generation error: {e}")
-        traceback.print_exc()
-        # Fallback - return 4 fallback panels
-        panels = story_processor.split_into_panels(statement, verdict, confidence, story)
-        return [comic_generator._create_fallback_panel(panel, style, i) for i, panel in enumerate(panels)]
+@app.after_request
+def add_request_id_header(response):
+    response.headers["X-Request-ID"] = current_request_id()
+    if request.endpoint in ("generate", "generate_batch", "create_job"):
+        metrics.requests.inc(endpoint=request.endpoint, status=response.status_code)
+    return response
+
+
+def collect_cache_metrics():
+    result_stats = result_cache.stats()
+    panel_stats = panel_cache.stats()
+    job_stats = job_manager.stats()
+    admission_stats = admission.stats()
+    claim_stats = claim_index.stats() if claim_index is not None else {"hits": 0, "misses": 0}
+    return [
+        ("factstrip_result_cache_hits_total", "counter", "Result cache hits", result_stats["hits"]),
+        ("factstrip_result_cache_misses_total", "counter", "Result cache misses", result_stats["misses"]),
+        ("factstrip_panel_cache_hits_total", "counter", "Panel image cache hits", panel_stats["hits"]),
+        ("factstrip_panel_cache_misses_total", "counter", "Panel image cache misses", panel_stats["misses"]),
+        ("factstrip_panel_cache_bytes", "gauge", "Bytes held by the panel image cache", panel_stats["bytes"]),
+        ("factstrip_claim_index_hits_total", "counter", "Statements answered from a similar claim", claim_stats["hits"]),
+        ("factstrip_claim_index_misses_total", "counter", "Claim index lookups with no close match", claim_stats["misses"]),
+        ("factstrip_jobs_queued", "gauge", "Jobs waiting for a worker", job_stats["queued"]),
+        ("factstrip_jobs_running", "gauge", "Jobs being processed", job_stats["running"]),
+        ("factstrip_admission_active", "gauge", "Requests holding a full pipeline slot", admission_stats["active"]),
+        ("factstrip_admission_queued", "gauge", "Requests waiting for a pipeline slot",
+         sum(admission_stats["queued"].values())),
+        ("factstrip_admission_text_only", "gauge", "Requests being answered text-only", admission_stats["text_only"]),
+    ]
+
+
+metrics.register_collector(collect_cache_metrics)
+
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    response = jsonify({"error": e.message})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
 
 
 # --- API Routes ---
@@ -114,6 +95,16 @@ def home():
         "status": "running",
         "endpoints": {
             "POST /api/generate": "Check facts and generate 4-panel comics",
+            "POST /api/generate/batch": "Check many statements, streams JSONL results",
+            "POST /api/jobs": "Queue a fact-check, returns a job id",
+            "GET /api/jobs/<id>": "Poll a job for its partial or final result",
+            "GET /api/jobs/<id>/events": "Server-Sent Events: verdict first, then each panel (preview, then final)",
+            "GET /api/images/<name>": "Content-addressed panel image",
+            "GET /api/history": "Past checks, newest first (?cursor=&limit=&verdict=&style=&since=&until=)",
+            "GET /api/history/search": "Full-text search over past statements (?q=&cursor=&limit=)",
+            "GET /api/history/<id>": "One past check with its panels",
+            "GET /api/analytics": "Totals by verdict, style and day",
+            "GET /metrics": "Prometheus metrics",
             "GET /health": "Health check"
         }
     })
@@ -129,76 +120,210 @@ def generate():
         if not statement:
             return jsonify({"error": "Statement is required"}), 400
 
-        print(f"\n🎯 New Request: '{statement}' | Style: {style}")
-
-        # Run AI analysis
-        analysis = analyze_statement(statement)
-        if not analysis:
-            return jsonify({"error": "Analysis failed"}), 500
-
-        # Parse response
-        try:
-            result = json.loads(analysis)
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON parse error: {e}")
-            return jsonify({"error": "Invalid analysis format"}), 500
-
-        # Validate fields
-        required_fields = ["verdict", "description", "story", "confidence"]
-        for field in required_fields:
-            if field not in result:
-                return jsonify({"error": f"Missing field: {field}"}), 500
-
-        # Mood analysis
-        mood, mood_confidence = detect_mood(statement)
-        print(f"🎭 Mood: {mood} ({mood_confidence}%)")
-
-        # Generate comic - NOW RETURNS 4 PANEL IMAGES
-        panel_images = generate_comic(
-            result["story"],
-            style,
-            result["verdict"],
-            result["confidence"],
-            statement
-        )
-
-        # Prepare panels text (for reference)
-        panels = story_processor.split_into_panels(
-            statement, 
-            result["verdict"], 
-            result["confidence"], 
-            result["story"]
-        )
-
-        response_data = {
-            "verdict": result["verdict"],
-            "confidence": result["confidence"],
-            "description": result["description"],
-            "story": result["story"],
-            "mood": mood,
-            "mood_confidence": mood_confidence,
-            "panel_images": panel_images,  # CHANGED: Now returns 4 images
-            "panels": panels,
-            "original_statement": statement,
-            "style": style,
-            "success": True
-        }
+        log(f"🎯 New Request: '{statement}' | Style: {style}")
+
+        # Same pipeline as the job API, we just wait for it here
+        admission.check_rate(request.remote_addr, "interactive")
+        job = job_manager.submit(statement, style)
+        if not job.wait(timeout=GENERATE_WAIT_TIMEOUT, preview=True):
+            # Still waiting on upstreams or an identical request, hand over the job instead of hanging
+            log(f"⏰ No result after {GENERATE_WAIT_TIMEOUT:.0f}s, answering with job {job.id}")
+            return jsonify({
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/api/jobs/{job.id}",
+                "events_url": f"/api/jobs/{job.id}/events"
+            }), 202
+        if job.error:
+            headers = {"Retry-After": str(job.retry_after)} if job.retry_after is not None else {}
+            return jsonify({"error": job.error}), job.error_status, headers
 
-        print("✅ Request completed successfully!")
-        return jsonify(response_data)
+        if not job.finished:
+            # Progressive rendering: answer with the preview, the job gets the refined panels
+            log("✅ Preview ready, refining in the background")
+            return jsonify(dict(job.preview, job_id=job.id, status_url=f"/api/jobs/{job.id}",
+                                events_url=f"/api/jobs/{job.id}/events"))
 
+        log("✅ Request completed successfully!")
+        return jsonify(job.result)
+
+    except AdmissionRejected:
+        raise  # 429 with Retry-After, from admission_rejected
     except Exception as e:
-        print(f"❌ Server error: {e}")
+        log(f"❌ Server error: {e}")
         traceback.print_exc()
         return jsonify({"error": "Internal server error", "success": False}), 500
 
 
+@app.route("/api/generate/batch", methods=["POST"])
+def generate_batch():
+    data = request.json or {}
+    items = data.get("items")
+    if items is None:
+        items = [{"statement": statement} for statement in data.get("statements", [])]
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items or statements is required"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+    items = [{"statement": item} if isinstance(item, str) else item for item in items]
+
+    admission.check_rate(request.remote_addr, "batch")
+    log(f"📦 New Batch Request: {len(items)} items")
+
+    def stream():
+        for record in batch_processor.process(items, default_style=data.get("style", "normal")):
+            yield json.dumps(record) + "\n"
+
+    return Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    data = request.json or {}
+    statement = data.get("statement", "").strip()
+    style = data.get("style", "normal")
+
+    if not statement:
+        return jsonify({"error": "Statement is required"}), 400
+
+    admission.check_rate(request.remote_addr, "interactive")
+    job = job_manager.submit(statement, style)
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events"
+    }), 202
+
+
+@app.route("/api/jobs/<job_id>")
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot())
+
+
+@app.route("/api/jobs/<job_id>/events")
+def job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    # Let reconnecting EventSource clients resume where they left off
+    last_event_id = request.headers.get("Last-Event-ID")
+    start = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    def stream():
+        index = start
+        while True:
+            events = job.wait_for_events(index, timeout=15)
+            if not events:
+                if job.finished:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for name, data in events:
+                yield f"id: {index}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+                index += 1
+                if name in ("done", "error"):
+                    return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/images/<name>")
+def get_image(name):
+    if not image_store.is_valid_name(name):
+        abort(404)
+
+    # The name is the content hash, so the bytes behind a URL never change
+    response = send_from_directory(os.path.abspath(image_store.directory), name,
+                                   max_age=31536000, conditional=True, etag=name.split(".")[0])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _history_page_args():
+    """Shared query args for the history endpoints, raises ValueError on bad input"""
+    cursor = request.args.get("cursor")
+    return {
+        "cursor": int(cursor) if cursor else None,
+        "limit": max(1, min(int(request.args.get("limit", 20)), HISTORY_PAGE_MAX)),
+        "verdict": request.args.get("verdict"),
+        "style": request.args.get("style")
+    }
+
+
+@app.route("/api/history")
+def history():
+    if history_store is None:
+        return jsonify({"error": "History is disabled"}), 404
+    try:
+        args = _history_page_args()
+        since = request.args.get("since")
+        until = request.args.get("until")
+        args["since"] = float(since) if since else None
+        args["until"] = float(until) if until else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor, limit or time range"}), 400
+    return jsonify(history_store.list(**args))
+
+
+@app.route("/api/history/search")
+def history_search():
+    if history_store is None:
+        return jsonify({"error": "History is disabled"}), 404
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        args = _history_page_args()
+    except ValueError:
+        return jsonify({"error": "Invalid cursor or limit"}), 400
+    return jsonify(history_store.search(query, **args))
+
+
+@app.route("/api/history/<int:check_id>")
+def history_item(check_id):
+    if history_store is None:
+        return jsonify({"error": "History is disabled"}), 404
+    item = history_store.get(check_id)
+    if item is None:
+        return jsonify({"error": "Check not found"}), 404
+    return jsonify(item)
+
+
+@app.route("/api/analytics")
+def analytics():
+    if history_store is None:
+        return jsonify({"error": "History is disabled"}), 404
+    try:
+        days = int(request.args.get("days", 30))
+    except ValueError:
+        return jsonify({"error": "Invalid days"}), 400
+    return jsonify(history_store.analytics(days=days))
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/health")
 def health():
     return jsonify({
         "status": "healthy", 
         "openai_configured": bool(OPENAI_API_KEY),
-        "replicate_configured": bool(REPLICATE_API_TOKEN)
+        "replicate_configured": bool(REPLICATE_API_TOKEN),
+        "result_cache": result_cache.stats(),
+        "panel_cache": panel_cache.stats(),
+        "claim_index": claim_index.stats() if claim_index is not None else {"enabled": False},
+        "jobs": job_manager.stats(),
+        "admission": admission.stats(),
+        "circuit_breakers": circuit_breakers.snapshot()
     })
 
 
@@ -0,0 +1,143 @@
+"""ASGI entry point: /api/generate on the event loop, everything else via Flask.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+POST /api/generate awaits OpenAI, Replicate and the image downloads instead of
+holding a thread for each in-flight request, so one worker can carry hundreds
+of them. PIL work, caches and SQLite run on thread pools. Every other route is
+the Flask app behind a WSGI adapter, so the API is the same in both modes.
+
+Progressive rendering and streamed analysis answer through jobs (a preview plus
+job_id / events_url), so with PROGRESSIVE_RENDERING or ANALYSIS_MODE=streaming
+on, /api/generate is served by the Flask route too.
+"""
+import json
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import openai
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+
+from admission import admission, AdmissionRejected
+from app import app as flask_app
+from comic_generator import comic_generator
+from fact_analyzer import fact_analyzer
+from fact_pipeline import fact_pipeline, PipelineError
+from http_clients import http_clients
+from metrics import metrics, start_request, log, log_timings
+
+
+class ThreadedWsgiToAsgi:
+    """asgiref's WSGI adapter, but each request runs on its own pool thread.
+
+    WsgiToAsgi runs every request on one shared thread (thread_sensitive), so a
+    single open SSE or batch stream would hold up /health, job polling and images.
+    """
+
+    def __init__(self, wsgi_app, max_threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiInstance(self.wsgi_app, self.executor)(scope, receive, send)
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_app, executor):
+        super().__init__(wsgi_app)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # The parent's run_wsgi_app is the sync body wrapped in a thread-sensitive sync_to_async
+        run = vars(WsgiToAsgiInstance)["run_wsgi_app"].func
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class AsgiApp:
+    def __init__(self, wsgi_app):
+        # Long-lived streams (SSE, batch NDJSON) each hold one of these threads
+        self.wsgi = ThreadedWsgiToAsgi(wsgi_app, int(os.getenv("ASGI_WSGI_THREADS", "64")))
+        # Both need the job machinery the Flask route has, so they keep using it
+        self.native_generate = not (comic_generator.progressive or fact_analyzer.streaming)
+        self._openai_session = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if (self.native_generate and scope["type"] == "http" and scope["path"] == "/api/generate"
+                and scope["method"] == "POST"):
+            return await self.generate(scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._openai_session is not None:
+                    await self._openai_session.close()
+                await http_clients.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def generate(self, scope, receive, send):
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        request_id = start_request(headers.get("x-request-id"))
+
+        # openai keeps a session per context, reuse one so calls share connections
+        if self._openai_session is None:
+            self._openai_session = aiohttp.ClientSession()
+        openai.aiosession.set(self._openai_session)
+
+        client = scope["client"][0] if scope.get("client") else None
+        status, payload, extra_headers = await self._generate(await self._read_body(receive), client)
+        metrics.requests.inc(endpoint="generate", status=status)
+        log_timings()
+
+        response_headers = [(b"content-type", b"application/json"), (b"x-request-id", request_id.encode())]
+        response_headers.extend(extra_headers)
+        if "origin" in headers:
+            response_headers.append((b"access-control-allow-origin", b"*"))
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": json.dumps(payload, sort_keys=True).encode("utf-8")})
+
+    async def _generate(self, body, client):
+        """Same contract as the Flask route, returns (status, payload, extra headers)"""
+        try:
+            data = json.loads(body or b"{}")
+            statement = data.get("statement", "").strip()
+            style = data.get("style", "normal")
+
+            if not statement:
+                return 400, {"error": "Statement is required"}, []
+
+            log(f"🎯 New Request: '{statement}' | Style: {style}")
+            admission.check_rate(client, "interactive")
+            result = await fact_pipeline.run_async(statement, style)
+            log("✅ Request completed successfully!")
+            return 200, result, []
+
+        except AdmissionRejected as e:
+            return e.status, {"error": e.message}, [(b"retry-after", str(e.retry_after).encode())]
+        except PipelineError as e:
+            return e.status, {"error": e.message}, []
+        except Exception as e:
+            log(f"❌ Server error: {e}")
+            traceback.print_exc()
+            return 500, {"error": "Internal server error", "success": False}, []
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+
+# Create global instance
+app = AsgiApp(flask_app)
@@ -0,0 +1,165 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()  # Before our modules read their settings when run from the command line
+
+from admission import admission, AdmissionRejected
+from fact_pipeline import fact_pipeline, PipelineError
+from result_cache import result_cache
+from metrics import bind_context, start_request, log, log_timings
+
+
+class BatchProcessor:
+    """Fact-checks many statements at once with bounded concurrency.
+
+    Duplicate statements (after normalization) are processed once. Panels whose
+    prompts match are rendered once too, because the comic generator coalesces
+    identical in-flight prompts and caches their backgrounds.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch")
+
+    def process(self, items, default_style="normal"):
+        """Yield one record per input item as soon as its result is ready"""
+        groups = {}  # cache key -> [(index, item_id, statement, style)]
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                yield self._record(index, None, None, default_style,
+                                   error="Item must be an object or a statement string")
+                continue
+            item_id = item.get("id")
+            statement = item.get("statement") or ""
+            style = item.get("style") or default_style
+            if not isinstance(statement, str) or not isinstance(style, str):
+                yield self._record(index, item_id, None, default_style,
+                                   error="statement and style must be strings")
+                continue
+            statement = statement.strip()
+            if not statement:
+                yield self._record(index, item_id, statement, style, error="Statement is required")
+                continue
+            key = result_cache.make_key(statement, style)
+            groups.setdefault(key, []).append((index, item_id, statement, style))
+
+        log(f"📦 Batch: {sum(len(g) for g in groups.values())} statements, {len(groups)} unique")
+
+        futures = {
+            self._executor.submit(bind_context(self._run_item), members[0][2], members[0][3]): key
+            for key, members in groups.items()
+        }
+        for future in as_completed(futures):
+            members = groups[futures[future]]
+            try:
+                result = future.result()
+                error = None
+            except (PipelineError, AdmissionRejected) as e:
+                result, error = None, e.message
+            except Exception as e:
+                log(f"❌ Batch item error: {e}")
+                traceback.print_exc()
+                result, error = None, "Internal server error"
+
+            for index, item_id, statement, style in members:
+                if result is not None:
+                    result = dict(result, original_statement=statement)
+                yield self._record(index, item_id, statement, style, result=result, error=error)
+
+    def _run_item(self, statement, style):
+        """One unique statement, logged under its own request id, queued behind interactive requests"""
+        start_request()
+        try:
+            return fact_pipeline.run(statement, style, priority="batch")
+        finally:
+            log_timings()
+
+    def _record(self, index, item_id, statement, style, result=None, error=None):
+        if error:
+            status = "error"
+        else:
+            # Shed to fallback panels under load: a usable verdict, but worth retrying for the comic
+            status = "text_only" if result.get("text_only") else "ok"
+        record = {
+            "index": index,
+            "id": item_id,
+            "statement": statement,
+            "style": style,
+            "status": status
+        }
+        if error:
+            record["error"] = error
+        else:
+            record["result"] = result
+        return record
+
+
+def read_items(path, input_format=None):
+    """Read statements from a JSONL or CSV file ("-" for stdin)"""
+    input_format = input_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    handle = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if input_format == "csv":
+            return [dict(row) for row in csv.DictReader(handle)]
+        items = []
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            # Bare JSON strings are accepted as statements, anything else but an object
+            # comes back from process() as an error record for its line
+            items.append({"statement": item} if isinstance(item, str) else item)
+        return items
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fact-check a feed of statements and write JSONL results")
+    parser.add_argument("input", help="JSONL or CSV file with a 'statement' column/field, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from extension)")
+    parser.add_argument("--style", default="normal", help="style for items that don't set one")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BATCH_WORKERS", "8")))
+    args = parser.parse_args(argv)
+
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    # The CLI has the machine to itself: --workers sets the concurrency, not the server's admission limits
+    admission.max_active = 0
+
+    items = read_items(args.input, args.format)
+    processor = BatchProcessor(max_workers=args.workers)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    failed = 0
+    try:
+        # Progress logs go to stderr so stdout stays pure JSONL
+        with contextlib.redirect_stdout(sys.stderr):
+            for record in processor.process(items, default_style=args.style):
+                failed += record["status"] != "ok"
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"✅ Batch finished: {len(items) - failed} ok, {failed} failed or text-only", file=sys.stderr)
+    return 1 if failed else 0
+
+
+# Create global instance
+batch_processor = BatchProcessor(max_workers=int(os.getenv("BATCH_WORKERS", "8")))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
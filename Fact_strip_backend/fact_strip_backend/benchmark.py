@@ -0,0 +1,278 @@
+"""Offline benchmarks for the Fact-Strip backend.
+
+Runs without network access or API keys: OpenAI and Replicate are replaced by
+local stand-ins with configurable latency and failure rates, and panel images
+are served from a local HTTP server so downloads still go over real sockets.
+Result, panel and similar-claim caches are off unless their env vars say
+otherwise, and the Replicate limiter (REPLICATE_MAX_CONCURRENCY / _PER_SECOND)
+still applies.
+
+    python benchmark.py load --requests 200 --concurrency 16
+    python benchmark.py render --iterations 50
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Keep the real services and caches out of the measurement, before anything reads settings
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("REPLICATE_API_TOKEN", "benchmark")
+os.environ.setdefault("RESULT_CACHE_BACKEND", "off")
+os.environ.setdefault("PANEL_CACHE_MAX_MB", "0")
+os.environ.setdefault("CLAIM_INDEX_BACKEND", "off")
+os.environ.setdefault("ADMISSION_CLIENT_RATE", "0")  # every request comes from 127.0.0.1
+os.environ.setdefault("IMAGE_STORE_DIR", os.path.join(tempfile.gettempdir(), "factstrip_bench_images"))
+os.environ.setdefault("HISTORY_DB_PATH", os.path.join(tempfile.gettempdir(), "factstrip_bench_history.db"))
+
+from PIL import Image
+
+
+class LatencyModel:
+    """Log-normal latency around a median, plus a failure probability"""
+
+    def __init__(self, median, sigma=0.25, failure_rate=0.0):
+        self.median = median
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+
+    def sample(self):
+        return random.lognormvariate(0, self.sigma) * self.median if self.median > 0 else 0
+
+    def wait(self, name):
+        time.sleep(self.sample())
+        self.maybe_fail(name)
+
+    def maybe_fail(self, name):
+        if random.random() < self.failure_rate:
+            raise RuntimeError(f"simulated {name} failure")
+
+
+def stream_completion(text, seconds, first_token_share=0.2, piece_size=4):
+    """Yield text in small delta chunks, spread over `seconds` like a streamed completion"""
+    pieces = [text[i:i + piece_size] for i in range(0, len(text), piece_size)]
+    time.sleep(seconds * first_token_share)
+    for piece in pieces:
+        yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta={"content": piece})])
+        time.sleep(seconds * (1 - first_token_share) / len(pieces))
+
+
+def install_fake_openai(latency):
+    """Replace openai.ChatCompletion.create with a canned, delayed (optionally streamed) response"""
+    import openai
+
+    def create(**kwargs):
+        if kwargs.get("stream"):
+            latency.maybe_fail("OpenAI")
+            return stream_completion(json.dumps(build_content(kwargs)), latency.sample())
+        latency.wait("OpenAI")
+        message = types.SimpleNamespace(content=json.dumps(build_content(kwargs)))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+    def build_content(kwargs):
+        system = kwargs["messages"][0]["content"]
+        statement = kwargs["messages"][-1]["content"]
+        if "Analyze mood" in system:
+            content = {"mood": random.choice(["neutral", "positive", "serious"]), "confidence": 80}
+        else:
+            content = {
+                "verdict": random.choice(["true", "false", "unverified"]),
+                "confidence": random.randint(40, 99),
+                "description": f"Benchmark analysis of {statement}. Evidence was reviewed carefully by experts. "
+                               "The conclusion follows from several independent sources.",
+                "story": "A curious student asks about the claim. A scientist explains the evidence in detail. "
+                         "They look at the data together. The verdict becomes clear to everyone."
+            }
+            if "mood_confidence" in system:
+                content.update(mood="neutral", mood_confidence=80)
+        return content
+
+    openai.ChatCompletion.create = create
+
+
+def install_fake_replicate(latency, image_url):
+    """Replace replicate.Client.run so every prediction points at the local image server"""
+    import replicate
+
+    def run(self, ref, input=None, **params):
+        latency.wait("Replicate")
+        return [f"{image_url}?seed={random.random()}"]
+
+    replicate.Client.run = run
+
+
+def start_image_server(size):
+    """Serve one PNG of the given size on a random local port, returns (server, url)"""
+    buffered = io.BytesIO()
+    Image.effect_noise((size, size), 64).convert("RGB").save(buffered, format="PNG")
+    payload = buffered.getvalue()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/panel.png"
+
+
+def quiet(enabled=True):
+    """Silence the backend's per-request logging while measuring"""
+    return contextlib.redirect_stdout(open(os.devnull, "w")) if enabled else contextlib.nullcontext()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_load(args):
+    image_server, image_url = start_image_server(args.image_size)
+    install_fake_openai(LatencyModel(args.openai_latency, args.sigma, args.openai_failure_rate))
+    install_fake_replicate(LatencyModel(args.replicate_latency, args.sigma, args.replicate_failure_rate), image_url)
+
+    from werkzeug.serving import make_server
+    from http_clients import http_clients
+    from metrics import metrics
+    with quiet(not args.verbose):
+        import app as backend
+
+    if not args.verbose:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    api_server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+    threading.Thread(target=api_server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{api_server.server_address[1]}/api/generate"
+
+    statements = [f"Benchmark claim number {i % args.unique} about bees" for i in range(args.requests)]
+    session = http_clients.session
+
+    def one_request(statement):
+        start = time.perf_counter()
+        try:
+            response = session.post(api_url, json={"statement": statement, "style": args.style}, timeout=600)
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    print(f"🏁 {args.requests} requests, concurrency {args.concurrency}, "
+          f"OpenAI ~{args.openai_latency}s, Replicate ~{args.replicate_latency}s")
+    started = time.perf_counter()
+    with quiet(not args.verbose):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(one_request, statements))
+    elapsed = time.perf_counter() - started
+
+    api_server.shutdown()
+    image_server.shutdown()
+
+    latencies = [latency for latency, ok in results if ok]
+    errors = sum(1 for _, ok in results if not ok)
+    report = {
+        "requests": len(results),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 2),  # successful ones only
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "stages": {
+            stage: {"count": count, "mean_ms": round(total / count * 1000, 2), "total_s": round(total, 3)}
+            for stage, (count, total) in sorted(metrics.stage_summary().items()) if count
+        }
+    }
+    return report
+
+
+def time_operation(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3)
+    }
+
+
+def run_render(args):
+    with quiet():
+        from comic_generator import comic_generator
+        from image_store import image_store
+
+    raw = Image.effect_noise((args.image_size, args.image_size), 64).convert("RGB")
+    text = "Did you know? Bees actually can fly thanks to rapid wing beats and the science of lift."
+    panel = comic_generator._add_speech_bubble_to_panel(raw.copy(), text)
+    panels = [panel.copy() for _ in range(4)]
+
+    print(f"🏁 PIL paths, {args.iterations} iterations, {args.image_size}px source")
+    with quiet():
+        return {
+            "_add_speech_bubble_to_panel": time_operation(
+                lambda: comic_generator._add_speech_bubble_to_panel(raw.copy(), text), args.iterations),
+            "_create_fallback_panel_image": time_operation(
+                lambda: comic_generator._create_fallback_panel_image(text, args.style, 0), args.iterations),
+            "_create_2x2_comic_layout": time_operation(
+                lambda: comic_generator._create_2x2_comic_layout(panels), args.iterations),
+            "image_to_base64": time_operation(
+                lambda: comic_generator.image_to_base64(panel), args.iterations),
+            f"image_store.encode ({image_store.image_format})": time_operation(
+                lambda: image_store.encode(panel), args.iterations),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Fact-Strip benchmarks")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    load = subcommands.add_parser("load", help="drive /api/generate against local stand-ins")
+    load.add_argument("--requests", type=int, default=100)
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument("--unique", type=int, default=1000000, help="distinct statements in the mix")
+    load.add_argument("--openai-latency", type=float, default=0.8, help="median seconds per OpenAI call")
+    load.add_argument("--openai-failure-rate", type=float, default=0.0)
+    load.add_argument("--replicate-latency", type=float, default=3.0, help="median seconds per prediction")
+    load.add_argument("--replicate-failure-rate", type=float, default=0.0)
+    load.add_argument("--sigma", type=float, default=0.25, help="log-normal spread of the latencies")
+    load.add_argument("--verbose", action="store_true", help="keep the backend's logs")
+
+    render = subcommands.add_parser("render", help="microbenchmark the PIL compositing paths")
+    render.add_argument("--iterations", type=int, default=50)
+
+    for sub in (load, render):
+        sub.add_argument("--style", default="normal")
+        sub.add_argument("--image-size", type=int, default=1024, help="side of the fake SDXL output")
+        sub.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+    report = run_load(args) if args.command == "load" else run_render(args)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import log
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+class CircuitBreaker:
+    """Trips on error rate or slow-call rate over the last `window` calls.
+
+    closed -> open when either rate crosses its threshold, open -> half_open after
+    `open_seconds`, and half_open lets `half_open_probes` calls through: one success
+    closes the breaker again, one failure reopens it.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, error_rate=0.5, slow_call_seconds=60,
+                 slow_call_rate=0.5, open_seconds=30, half_open_probes=1):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = "closed"
+        self.opened_at = None
+        self.short_circuited = 0
+        self._outcomes = deque(maxlen=window)  # (failed, slow)
+        self._latencies = deque(maxlen=100)  # successful call durations, for hedging
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go through right now (counts it as a probe when half-open)"""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = "half_open"
+                self._probes_in_flight = 0
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record(self, succeeded, duration):
+        with self._lock:
+            slow = duration >= self.slow_call_seconds
+            if succeeded:
+                self._latencies.append(duration)
+
+            if self.state == "half_open":
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if succeeded and not slow:
+                    self._close()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append((not succeeded, slow))
+            if self.state == "closed" and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for failed, _ in self._outcomes if failed)
+                slow_calls = sum(1 for _, slow_call in self._outcomes if slow_call)
+                if (failures / len(self._outcomes) >= self.error_rate or
+                        slow_calls / len(self._outcomes) >= self.slow_call_rate):
+                    self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        log(f"🔌 Circuit breaker for {self.name} opened")
+
+    def _close(self):
+        self.state = "closed"
+        self.opened_at = None
+        self._outcomes.clear()
+        log(f"🔌 Circuit breaker for {self.name} closed")
+
+    def latency_percentile(self, pct):
+        """Recent successful latency at pct, or None until there are enough samples"""
+        with self._lock:
+            if len(self._latencies) < self.min_calls:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def snapshot(self):
+        with self._lock:
+            failures = sum(1 for failed, _ in self._outcomes if failed)
+            return {
+                "state": self.state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": failures,
+                "short_circuited": self.short_circuited,
+                "retry_in_seconds": (max(0, round(self.open_seconds - (time.monotonic() - self.opened_at), 1))
+                                     if self.state == "open" else None)
+            }
+
+
+class CircuitBreakerRegistry:
+    """One breaker per upstream (e.g. per Replicate model), created on first use"""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, **self.settings)
+            return breaker
+
+    def snapshot(self):
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {name: breaker.snapshot() for name, breaker in breakers}
+
+
+# Create global instance
+circuit_breakers = CircuitBreakerRegistry(
+    window=int(os.getenv("BREAKER_WINDOW", "20")),
+    min_calls=int(os.getenv("BREAKER_MIN_CALLS", "5")),
+    error_rate=float(os.getenv("BREAKER_ERROR_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "60")),
+    slow_call_rate=float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.5")),
+    open_seconds=float(os.getenv("BREAKER_OPEN_SECONDS", "30")),
+    half_open_probes=int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+)
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from metrics import log
+from result_cache import normalize_statement
+from sqlite_connections import SqliteConnections
+
+# Words too common to say anything about which claim this is
+STOPWORDS = frozenset("""
+a an the is are was were be been being am do does did of in on at to for from by with about as
+that this these those it its and or but if then than so says say said according really actually
+""".split())
+
+# A claim and its negation share every other word, so they must never match each other
+NEGATIONS = frozenset("""
+not no never none nobody nothing neither nor cannot cant dont doesnt didnt isnt arent wasnt
+werent wont wouldnt shouldnt couldnt hasnt havent hadnt mustnt t
+""".split())  # normalization turns "can't" into "can t"
+
+# "safe" / "unsafe", "able" / "disable": one prefix flips the claim
+POLARITY_PREFIXES = ("un", "in", "dis")
+
+# Bumped whenever the signature scheme changes, stored claims are re-banded on startup
+SCHEME_VERSION = 2
+
+GOLDEN_64 = 0x9E3779B97F4A7C15
+MASK_64 = (1 << 64) - 1
+
+
+class ClaimIndex:
+    """MinHash/LSH index of checked statements for reusing verdicts on paraphrases.
+
+    Statements become sets of whole words minus stopwords. Character n-grams
+    were tried and rejected: "safe" sits inside "unsafe" and "vitamin c" is one
+    letter from "vitamin d", so opposite claims scored as near-duplicates. On
+    top of the similarity threshold, two claims only match when they agree on
+    negation and on their key words (numbers, single letters, un-/in-/dis-
+    words), which also salt the band keys so such pairs are never candidates.
+
+    The signature uses one-permutation hashing: each word is hashed once and
+    binned, the minimum per bin is kept and empty bins borrow from another bin,
+    which costs one hash per word instead of one per word per permutation. The
+    band buckets live in an indexed SQLite table, so a lookup is one indexed
+    query plus an exact Jaccard check on the few candidates, whatever the size
+    of the index.
+    """
+
+    def __init__(self, path, threshold=0.6, bands=16, rows=4, max_candidates=50):
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.max_candidates = max_candidates
+        self.bins = bands * rows
+        # Empty bins borrow from other bins in a fixed pseudo-random order (not from
+        # their neighbour), so one band doesn't end up holding a single real value.
+        # Not crc32: it's linear, so every slot would get the same order XOR-shuffled
+        # and one new word would change a bin in every band
+        self._borrow_order = [
+            sorted(range(self.bins),
+                   key=lambda other: hashlib.blake2b(struct.pack("II", slot, other), digest_size=8).digest())
+            for slot in range(self.bins)
+        ]
+        self.hits = 0
+        self.misses = 0
+        self._connections = SqliteConnections(path)
+        self._lock = threading.Lock()
+        with self._connections.get() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS claims (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                style TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                statement TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE (style, normalized)
+            )""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS claim_bands (
+                band_key INTEGER NOT NULL,
+                claim_id INTEGER NOT NULL,
+                PRIMARY KEY (band_key, claim_id)
+            ) WITHOUT ROWID""")
+            # Kept by add(), so stats() doesn't scan the claims table on every /metrics scrape
+            conn.execute("""CREATE TABLE IF NOT EXISTS claim_count (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                count INTEGER NOT NULL
+            )""")
+            if conn.execute("SELECT count FROM claim_count").fetchone() is None:
+                conn.execute("INSERT INTO claim_count (id, count) SELECT 0, COUNT(*) FROM claims")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEME_VERSION:
+                self._reband(conn)
+
+    def _reband(self, conn):
+        """Recompute every stored claim's band keys after a signature scheme change"""
+        conn.execute("DELETE FROM claim_bands")
+        claims = conn.execute("SELECT id, style, normalized FROM claims").fetchall()
+        for claim_id, style, normalized in claims:
+            _, band_keys = self._prepare_normalized(normalized, style)
+            conn.executemany("INSERT INTO claim_bands (band_key, claim_id) VALUES (?, ?)",
+                             [(key, claim_id) for key in band_keys])
+        conn.execute(f"PRAGMA user_version = {SCHEME_VERSION}")
+        if claims:
+            log(f"🔁 Re-indexed {len(claims)} claims for signature scheme {SCHEME_VERSION}")
+
+    def _shingles(self, tokens):
+        return {token for token in tokens if token not in STOPWORDS and token not in NEGATIONS}
+
+    def _negated(self, tokens):
+        return sum(1 for token in tokens if token in NEGATIONS) % 2 == 1
+
+    def _key_words(self, shingles):
+        """Words that must be identical for two claims to match, whatever the rest scores"""
+        return frozenset(
+            word for word in shingles
+            if len(word) == 1 or any(ch.isdigit() for ch in word)
+            or any(word.startswith(prefix) and len(word) - len(prefix) >= 3 for prefix in POLARITY_PREFIXES)
+        )
+
+    def _band_keys(self, shingles, style, negated):
+        # crc32 rather than hash(): signatures must agree across restarts and worker processes
+        signature = [None] * self.bins
+        for word in shingles:
+            h = (zlib.crc32(word.encode("utf-8")) * GOLDEN_64) & MASK_64
+            slot = (h >> 32) % self.bins
+            if signature[slot] is None or h < signature[slot]:
+                signature[slot] = h
+        binned = list(signature)
+        for slot in range(self.bins):
+            if binned[slot] is None:
+                signature[slot] = next(binned[other] for other in self._borrow_order[slot]
+                                       if binned[other] is not None)
+
+        key_words = " ".join(sorted(self._key_words(shingles)))
+        salt = zlib.crc32(f"{style}\n{int(negated)}\n{key_words}".encode("utf-8"))
+        keys = []
+        for band in range(self.bands):
+            chunk = struct.pack(f"{self.rows}Q", *signature[band * self.rows:(band + 1) * self.rows])
+            keys.append(band << 32 | zlib.crc32(chunk, salt))
+        return keys
+
+    def _prepare(self, statement, style):
+        normalized = normalize_statement(statement)
+        return (normalized,) + self._prepare_normalized(normalized, style)
+
+    def _prepare_normalized(self, normalized, style):
+        tokens = normalized.split()
+        shingles = self._shingles(tokens)
+        if not shingles:
+            return shingles, []
+        return shingles, self._band_keys(shingles, style, self._negated(tokens))
+
+    def lookup(self, statement, style):
+        """The stored result of the most similar earlier claim, or None below the threshold"""
+        normalized, shingles, band_keys = self._prepare(statement, style)
+        match = None
+        if band_keys:
+            conn = self._connections.get()
+            placeholders = ",".join("?" * len(band_keys))
+            rows = conn.execute(f"""SELECT id, statement, normalized FROM claims WHERE id IN (
+                SELECT DISTINCT claim_id FROM claim_bands WHERE band_key IN ({placeholders}) LIMIT ?
+            )""", band_keys + [self.max_candidates]).fetchall()
+
+            best_score = self.threshold
+            negated = self._negated(normalized.split())
+            key_words = self._key_words(shingles)
+            for claim_id, stored_statement, stored_normalized in rows:
+                stored_tokens = stored_normalized.split()
+                stored_shingles = self._shingles(stored_tokens)
+                # Band keys are salted with these, this only guards against crc32 collisions
+                if self._negated(stored_tokens) != negated or self._key_words(stored_shingles) != key_words:
+                    continue
+                score = len(shingles & stored_shingles) / len(shingles | stored_shingles)
+                if score >= best_score:
+                    best_score, match = score, (claim_id, stored_statement, score)
+
+        with self._lock:
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if match is None:
+            return None
+
+        claim_id, stored_statement, score = match
+        row = self._connections.get().execute("SELECT result FROM claims WHERE id = ?", (claim_id,)).fetchone()
+        log(f"🔁 Similar claim ({score:.2f}): '{stored_statement}'")
+        return dict(json.loads(row[0]), similar_to=stored_statement, similarity=round(score, 3))
+
+    def add(self, statement, style, result):
+        """Index a checked statement and its result (no-op if already indexed)"""
+        normalized, _, band_keys = self._prepare(statement, style)
+        if not band_keys:
+            return
+        with self._connections.get() as conn:
+            cursor = conn.execute(
+                """INSERT OR IGNORE INTO claims (style, normalized, statement, result, created_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (style, normalized, statement, json.dumps(result), time.time())
+            )
+            if cursor.rowcount:
+                conn.executemany("INSERT INTO claim_bands (band_key, claim_id) VALUES (?, ?)",
+                                 [(key, cursor.lastrowid) for key in band_keys])
+                conn.execute("UPDATE claim_count SET count = count + 1")
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "claims": self._connections.get().execute("SELECT count FROM claim_count").fetchone()[0],
+            "threshold": self.threshold
+        }
+
+
+def _create_claim_index():
+    if os.getenv("CLAIM_INDEX_BACKEND", "off") != "sqlite":
+        return None  # opt in: a similar claim is not always the same claim
+    return ClaimIndex(
+        os.getenv("CLAIM_INDEX_PATH", "claim_index.db"),
+        threshold=float(os.getenv("CLAIM_MATCH_THRESHOLD", "0.6"))
+    )
+
+
+# Create global instance
+claim_index = _create_claim_index()
@@ -1,8 +1,21 @@
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
+from PIL import Image, ImageDraw
+import asyncio
 import base64
 from io import BytesIO
-import requests
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+import os
+import threading
+
+from panel_cache import panel_cache
+from http_clients import http_clients
+from metrics import metrics, bind_context, log
+from image_store import image_store
+from render_assets import RenderAssets
+from render_pool import RenderPool
+
+# Use the latest stable SDXL model
+SDXL_MODEL = "stability-ai/sdxl:39ed52f2a78e934b3ba6e2a89f5b1c712de7dfea535525255b1aa35c5565e08b"
+
 
 class ComicGenerator:
     def __init__(self):
@@ -11,32 +24,158 @@ class ComicGenerator:
         self.panel_height = 400   # 400 ÷ 8 = 50 ✓
         self.comic_width = 800    # 800 ÷ 8 = 100 ✓ (2 panels wide)
         self.comic_height = 800   # 800 ÷ 8 = 100 ✓ (2 panels high)
-    
+
+        # Panels are generated concurrently on a shared, bounded pool
+        self.max_workers = int(os.getenv("PANEL_MAX_WORKERS", "8"))
+        self.panel_timeout = float(os.getenv("PANEL_TIMEOUT", "90"))  # seconds per panel
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="panel")
+        self._inflight = {}  # panel cache key -> Future of the prediction being made for it
+        self._inflight_lock = threading.Lock()
+        self._inflight_async = {}  # same, for the ASGI app's event loop
+
+        # Progressive rendering: a quick low-step preview of every panel first, then the full-quality pass
+        self.progressive = os.getenv("PROGRESSIVE_RENDERING", "false").lower() in ("1", "true", "yes")
+        self.tiers = {
+            "preview": (os.getenv("PREVIEW_MODEL", SDXL_MODEL), int(os.getenv("PREVIEW_STEPS", "8"))),
+            "final": (os.getenv("PANEL_MODEL", SDXL_MODEL), int(os.getenv("PANEL_STEPS", "25")))
+        }
+
+        # Style-based background color for fallback panels
+        self.bg_colors = {
+            'anime': (255, 240, 245),
+            'newspaper': (220, 220, 220),
+            'normal': (235, 245, 255)
+        }
+        assets_args = dict(
+            panel_width=self.panel_width, panel_height=self.panel_height, bg_colors=self.bg_colors,
+            font_path=os.getenv("FONT_PATH"),
+            memo_size=int(os.getenv("BUBBLE_MEMO_SIZE", "256"))
+        )
+        self.render_assets = RenderAssets(**assets_args)
+        self.render_assets.preload()
+
+        # Captioning and encoding in worker processes, one per core; 0 keeps it on the panel threads
+        cpu_count = os.cpu_count() or 1
+        self.render_pool = RenderPool(
+            int(os.getenv("RENDER_WORKERS", str(cpu_count if cpu_count > 1 else 0))), assets_args)
+
+    def generate_panel_images(self, style, panels, statement, on_panel=None):
+        """Generate all panels at once, returns PIL images in panel order.
+
+        on_panel(index, image) is called as each panel finishes, fastest first.
+        """
+        panel_images, _ = self._generate_panels(self._render_panel, self._create_fallback_panel_image,
+                                                style, panels, statement, on_panel)
+        return panel_images
+
+    def generate_comic_panels(self, style, panels, statement, on_panel=None, tier="final", previous=None,
+                              cancel=None):
+        """Generate 4 separate panel images at a rendering tier, returns (image URLs, fell_back).
+
+        fell_back is the set of panel indices that didn't get a fresh render.
+        previous holds the preview URLs when refining, a panel whose final render
+        fails keeps its preview instead of becoming a fallback panel (it still
+        counts as fallen back). Setting cancel (a threading.Event) drops the
+        panels that haven't started, the caller is discarding the comic.
+        """
+        fallback = self._create_fallback_panel
+        if previous:
+            fallback = lambda panel_text, style, i: previous[i] or self._create_fallback_panel(panel_text, style, i)
+        return self._generate_panels(self._render_and_publish_panel, fallback,
+                                     style, panels, statement, on_panel, tier, cancel)
+
+    def _generate_panels(self, render, fallback, style, panels, statement, on_panel, tier="final", cancel=None):
+        """render(panel_text, style, index, statement, tier) for every panel on the panel pool,
+        with fallback(panel_text, style, index) for the ones that fail, come back empty or run late.
+
+        Returns (panel_images, fell_back), fell_back being the indices that got fallback().
+        Once cancel is set it returns early, leaving the unfinished panels as None."""
+        log(f"🎨 Generating {len(panels)} {tier} panels concurrently...")
+
+        def render_unless_cancelled(panel_text, style, i, statement, tier):
+            # A panel still queued for a thread when the comic is dropped never reaches SDXL
+            if cancel is not None and cancel.is_set():
+                return None
+            return render(panel_text, style, i, statement, tier)
+
+        futures = {
+            self._executor.submit(bind_context(render_unless_cancelled), panel_text, style, i, statement, tier): i
+            for i, panel_text in enumerate(panels)
+        }
+        panel_images = [None] * len(panels)
+        fell_back = set()
+
+        def finish_fallback(i):
+            fell_back.add(i)
+            finish(i, fallback(panels[i], style, i))
+
+        def finish(i, image):
+            panel_images[i] = image
+            if on_panel:
+                on_panel(i, image)
+
+        # Every panel was submitted at the same time, so one timeout is each panel's deadline
+        try:
+            for future in as_completed(futures, timeout=self.panel_timeout):
+                if cancel is not None and cancel.is_set():
+                    log(f"🛑 Dropping the remaining {tier} panels")
+                    for pending in futures:
+                        pending.cancel()
+                    return panel_images, fell_back
+                i = futures[future]
+                if future.exception():
+                    log(f"❌ Panel {i+1} failed: {future.exception()}")
+                    finish_fallback(i)
+                elif future.result() is None:
+                    finish_fallback(i)
+                else:
+                    finish(i, future.result())
+        except FuturesTimeoutError:
+            for future, i in futures.items():
+                if panel_images[i] is not None:
+                    continue
+                # A panel can finish between the deadline and here, keep its real image
+                if future.done() and not future.cancelled() and future.exception() is None \
+                        and future.result() is not None:
+                    finish(i, future.result())
+                    continue
+                future.cancel()
+                log(f"⏰ Panel {i+1} missed its {self.panel_timeout:.0f}s deadline, using fallback")
+                finish_fallback(i)
+
+        return panel_images, fell_back
+
+    async def generate_comic_panels_async(self, style, panels, statement):
+        """generate_comic_panels() for the ASGI app, returns (image URLs, fell_back).
+
+        SDXL and downloads are awaited on the event loop; captioning, encoding and
+        cache I/O run on the panel pool so they never block it.
+        """
+        log(f"🎨 Generating {len(panels)} panels concurrently...")
+        tasks = [asyncio.create_task(self._render_panel_async(panel_text, style, i, statement))
+                 for i, panel_text in enumerate(panels)]
+        await asyncio.wait(tasks, timeout=self.panel_timeout)
+
+        panel_urls = []
+        fell_back = set()
+        for i, task in enumerate(tasks):
+            if not task.done():
+                task.cancel()
+                log(f"⏰ Panel {i+1} missed its {self.panel_timeout:.0f}s deadline, using fallback")
+            elif task.exception() is None:
+                if task.result() is not None:
+                    panel_urls.append(task.result())
+                    continue
+            else:
+                log(f"❌ Panel {i+1} failed: {task.exception()}")
+            fell_back.add(i)
+            panel_urls.append(await self._run_on_pool(self._create_fallback_panel, panels[i], style, i))
+        return panel_urls, fell_back
+
     def generate_single_comic_image(self, style, panels, statement):
         """Generate ONE single image with 4 panels arranged in 2x2 grid"""
-        print(f"🎨 Generating single comic image with 4 panels...")
-        
-        # Generate each panel individually
-        panel_images = []
-        for i, panel_text in enumerate(panels):
-            prompt = self._create_panel_prompt(panel_text, style, i, statement)
-            print(f"  Generating Panel {i+1}...")
-            
-            image_url = self._generate_single_panel(prompt, style)
-            if image_url:
-                try:
-                    response = requests.get(image_url)
-                    if response.status_code == 200:
-                        image = Image.open(BytesIO(response.content))
-                        image_with_bubble = self._add_speech_bubble_to_panel(image, panel_text)
-                        panel_images.append(image_with_bubble)
-                    else:
-                        panel_images.append(self._create_fallback_panel_image(panel_text, style, i))
-                except:
-                    panel_images.append(self._create_fallback_panel_image(panel_text, style, i))
-            else:
-                panel_images.append(self._create_fallback_panel_image(panel_text, style, i))
-        
+        panel_images = self.generate_panel_images(style, panels, statement)
+
         # Create the final single comic image with 2x2 grid
         final_comic = self._create_2x2_comic_layout(panel_images)
         
@@ -59,8 +198,10 @@ class ComicGenerator:
         
         for i, (x, y) in enumerate(positions):
             if i < len(panel_images):
-                # Resize panel to fit the grid
-                panel = panel_images[i].resize((self.panel_width, self.panel_height), Image.Resampling.LANCZOS)
+                # Captioned panels are already panel-sized, only resize anything that isn't
+                panel = panel_images[i]
+                if panel.size != (self.panel_width, self.panel_height):
+                    panel = panel.resize((self.panel_width, self.panel_height), Image.Resampling.LANCZOS)
                 comic.paste(panel, (x, y))
         
         # Add borders between panels
@@ -74,28 +215,171 @@ class ComicGenerator:
         
         return comic
 
+    def _render_panel(self, panel_text, style, panel_index, statement, tier="final"):
+        """Generate, download and caption one panel (runs on the panel pool), None if SDXL gave nothing"""
+        image_bytes = self._panel_background_for(panel_text, style, panel_index, statement, tier)
+        if image_bytes is None:
+            return None
+
+        image = Image.open(BytesIO(image_bytes))
+        return self._add_speech_bubble_to_panel(image, panel_text)
+
+    def _render_and_publish_panel(self, panel_text, style, panel_index, statement, tier="final"):
+        """_render_panel(), finished as an image URL (captioned in a render worker when enabled)"""
+        if not self.render_pool.enabled:
+            image = self._render_panel(panel_text, style, panel_index, statement, tier)
+            return image_store.publish(image) if image is not None else None
+
+        image_bytes = self._panel_background_for(panel_text, style, panel_index, statement, tier)
+        if image_bytes is None:
+            return None
+        return self._caption_and_publish(image_bytes, panel_text, style, panel_index)
+
+    def _panel_background_for(self, panel_text, style, panel_index, statement, tier):
+        prompt = self._create_panel_prompt(panel_text, style, panel_index, statement)
+        log(f"  Generating Panel {panel_index+1} ({tier})...")
+
+        # Identical prompts share one background image, only the bubble differs
+        model, input_params = self._build_panel_params(prompt, style, tier)
+        return self._get_panel_background(model, input_params, panel_index)
+
+    def _get_panel_background(self, model, input_params, panel_index):
+        """Cached or freshly generated panel bytes, identical prompts in flight share one prediction"""
+        cache_key = panel_cache.make_key(model, input_params)
+        image_bytes = panel_cache.get(cache_key)
+        if image_bytes is not None:
+            log(f"⚡ Panel {panel_index+1} served from panel cache")
+            metrics.panels.inc(source="panel_cache")
+            return image_bytes
+
+        with self._inflight_lock:
+            pending = self._inflight.get(cache_key)
+            is_leader = pending is None
+            if is_leader:
+                pending = self._inflight[cache_key] = Future()
+
+        if not is_leader:
+            log(f"🔗 Panel {panel_index+1} joined an identical prompt already in flight")
+            image_bytes = pending.result()
+            if image_bytes is not None:
+                metrics.panels.inc(source="coalesced")
+            return image_bytes
+
+        try:
+            image_bytes = self._fetch_panel_bytes(model, input_params, panel_index)
+            if image_bytes is not None:
+                metrics.panels.inc(source="sdxl")
+                panel_cache.set(cache_key, image_bytes)
+            pending.set_result(image_bytes)
+            return image_bytes
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[cache_key]
+
+    async def _render_panel_async(self, panel_text, style, panel_index, statement):
+        prompt = self._create_panel_prompt(panel_text, style, panel_index, statement)
+        log(f"  Generating Panel {panel_index+1}...")
+
+        model, input_params = self._build_panel_params(prompt, style)
+        image_bytes = await self._get_panel_background_async(model, input_params, panel_index)
+        if image_bytes is None:
+            return None
+        return await self._run_on_pool(self._caption_and_publish, image_bytes, panel_text, style, panel_index)
+
+    def _caption_and_publish(self, image_bytes, panel_text, style, panel_index):
+        """CPU half of a panel: bubble (or fallback) and encode, returns the image URL"""
+        if self.render_pool.enabled:
+            if image_bytes is None:
+                metrics.panels.inc(source="fallback")
+            return self.render_pool.caption_and_publish(
+                image_bytes, self._clean_panel_text(panel_text), style, panel_index)
+        if image_bytes is None:
+            return self._create_fallback_panel(panel_text, style, panel_index)
+        image = Image.open(BytesIO(image_bytes))
+        return image_store.publish(self._add_speech_bubble_to_panel(image, panel_text))
+
+    async def _get_panel_background_async(self, model, input_params, panel_index):
+        """_get_panel_background() for the event loop, coalesces identical prompts with tasks"""
+        cache_key = panel_cache.make_key(model, input_params)
+        image_bytes = await self._run_on_pool(panel_cache.get, cache_key)
+        if image_bytes is not None:
+            log(f"⚡ Panel {panel_index+1} served from panel cache")
+            metrics.panels.inc(source="panel_cache")
+            return image_bytes
+
+        pending = self._inflight_async.get(cache_key)
+        if pending is not None:
+            log(f"🔗 Panel {panel_index+1} joined an identical prompt already in flight")
+            image_bytes = await asyncio.shield(pending)
+            if image_bytes is not None:
+                metrics.panels.inc(source="coalesced")
+            return image_bytes
+
+        pending = self._inflight_async[cache_key] = asyncio.ensure_future(
+            self._fetch_panel_bytes_async(model, input_params, panel_index))
+        try:
+            # Shielded so one request timing out doesn't cancel the prediction for the others
+            image_bytes = await asyncio.shield(pending)
+        finally:
+            if pending.done():
+                self._inflight_async.pop(cache_key, None)
+            else:
+                pending.add_done_callback(lambda _: self._inflight_async.pop(cache_key, None))
+        if image_bytes is not None:
+            metrics.panels.inc(source="sdxl")
+            await self._run_on_pool(panel_cache.set, cache_key, image_bytes)
+        return image_bytes
+
+    async def _fetch_panel_bytes_async(self, model, input_params, panel_index):
+        image_url = await self._generate_single_panel_async(model, input_params)
+        if not image_url:
+            return None
+
+        try:
+            with metrics.span("download"):
+                image_bytes = await http_clients.download_async(image_url)
+            await self._run_on_pool(lambda: Image.open(BytesIO(image_bytes)).verify())
+            return image_bytes
+        except Exception as e:
+            log(f"❌ Download error for panel {panel_index+1}: {e}")
+            return None
+
+    def _run_on_pool(self, fn, *args):
+        """Await fn(*args) on the panel pool, keeping the request id"""
+        return asyncio.get_running_loop().run_in_executor(self._executor, bind_context(fn), *args)
+
+    def _fetch_panel_bytes(self, model, input_params, panel_index):
+        """Run SDXL and download the result, returns raw image bytes or None"""
+        image_url = self._generate_single_panel(model, input_params)
+        if not image_url:
+            return None
+
+        try:
+            with metrics.span("download"):
+                image_bytes = http_clients.download(image_url)
+            # Make sure it decodes before it ends up in the cache
+            Image.open(BytesIO(image_bytes)).verify()
+            return image_bytes
+        except Exception as e:
+            log(f"❌ Download error for panel {panel_index+1}: {e}")
+            return None
+
+    def _create_fallback_panel(self, panel_text, style, panel_index):
+        """Create fallback panel and return its image URL"""
+        if self.render_pool.enabled:
+            return self._caption_and_publish(None, panel_text, style, panel_index)
+        image = self._create_fallback_panel_image(panel_text, style, panel_index)
+        return image_store.publish(image)
+
     def _create_fallback_panel_image(self, panel_text, style, panel_index):
         """Create fallback panel as PIL Image (not base64)"""
-        image = Image.new('RGB', (self.panel_width, self.panel_height), color=(240, 240, 240))
-        draw = ImageDraw.Draw(image)
-        
-        # Style-based background color
-        bg_colors = {
-            'anime': (255, 240, 245),
-            'newspaper': (220, 220, 220),
-            'normal': (235, 245, 255)
-        }
-        
-        bg_color = bg_colors.get(style, (240, 240, 240))
-        draw.rectangle([0, 0, self.panel_width, self.panel_height], fill=bg_color)
-        
-        # Add panel border
-        draw.rectangle([5, 5, self.panel_width-5, self.panel_height-5], outline="black", width=2)
-        
-        # Add panel number
-        font_large = self._load_best_font(20)
-        draw.text((self.panel_width//2 - 30, 20), f"Panel {panel_index + 1}", fill="black", font=font_large)
-        
+        metrics.panels.inc(source="fallback")
+        # Background, border and panel number are pre-rendered per style
+        image = self.render_assets.fallback_background(style, panel_index)
+
         # Add speech bubble with text
         image_with_bubble = self._add_speech_bubble_to_panel(image, panel_text)
         
@@ -138,101 +422,62 @@ class ComicGenerator:
         
         return clean_prompt
     
-    def _generate_single_panel(self, prompt, style):
+    def _build_panel_params(self, prompt, style, tier="final"):
+        """Build the Replicate model and input for a panel prompt at a rendering tier"""
+        model, steps = self.tiers[tier]
+
+        input_params = {
+            "prompt": prompt,
+            "width": self.panel_width,
+            "height": self.panel_height,
+            "num_outputs": 1,
+            "guidance_scale": 7.5,
+            "num_inference_steps": steps
+        }
+
+        # Style-specific enhancements
+        if style == "newspaper":
+            input_params["prompt"] += ", black and white, grayscale, newspaper comic style, ink drawing"
+            input_params["negative_prompt"] = "color, colorful"
+        elif style == "anime":
+            input_params["prompt"] += ", anime style, manga, Japanese animation, vibrant colors"
+        else:  # normal style
+            input_params["prompt"] += ", educational comic style, clear illustration, professional artwork"
+
+        return model, input_params
+
+    @metrics.timed("generate_single_panel")
+    def _generate_single_panel(self, model, input_params):
         """Generate a single panel image using Replicate"""
         try:
-            from replicate import Client
-            import os
-            
-            client = Client(api_token=os.environ.get("REPLICATE_API_TOKEN"))
-            
-            # Use the latest stable SDXL model
-            model = "stability-ai/sdxl:39ed52f2a78e934b3ba6e2a89f5b1c712de7dfea535525255b1aa35c5565e08b"
-            
-            input_params = {
-                "prompt": prompt,
-                "width": self.panel_width,
-                "height": self.panel_height,
-                "num_outputs": 1,
-                "guidance_scale": 7.5,
-                "num_inference_steps": 25
-            }
-            
-            # Style-specific enhancements
-            if style == "newspaper":
-                input_params["prompt"] += ", black and white, grayscale, newspaper comic style, ink drawing"
-                input_params["negative_prompt"] = "color, colorful"
-            elif style == "anime":
-                input_params["prompt"] += ", anime style, manga, Japanese animation, vibrant colors"
-            else:  # normal style
-                input_params["prompt"] += ", educational comic style, clear illustration, professional artwork"
-            
-            print(f"🤖 Generating with SDXL: {prompt[:100]}...")
-            output = client.run(model, input=input_params)
+            log(f"🤖 Generating with SDXL: {input_params['prompt'][:100]}...")
+            output = http_clients.run_replicate(model, input_params)
             
             return output[0] if output else None
             
         except Exception as e:
-            print(f"❌ Replicate error for single panel: {e}")
+            log(f"❌ Replicate error for single panel: {e}")
             return None
     
+    @metrics.timed_async("generate_single_panel")
+    async def _generate_single_panel_async(self, model, input_params):
+        try:
+            log(f"🤖 Generating with SDXL: {input_params['prompt'][:100]}...")
+            output = await http_clients.run_replicate_async(model, input_params)
+            return output[0] if output else None
+        except Exception as e:
+            log(f"❌ Replicate error for single panel: {e}")
+            return None
+
+    @metrics.timed("add_speech_bubble")
     def _add_speech_bubble_to_panel(self, image, text):
         """Add speech bubble to a single panel image"""
-        # Resize image to standard panel size if needed
-        if image.size != (self.panel_width, self.panel_height):
-            image = image.resize((self.panel_width, self.panel_height), Image.Resampling.LANCZOS)
-        
-        draw = ImageDraw.Draw(image)
-        font = self._load_best_font(14)
-        
-        # Clean and wrap text
-        clean_text = self._clean_panel_text(text)
-        wrapped_text = textwrap.fill(clean_text, width=30)
-        
-        # Speech bubble position (top of panel)
-        bubble_x, bubble_y = 30, 20
-        max_width = 340
-        max_height = 80
-        
-        # Calculate text size
-        bbox = draw.textbbox((0, 0), wrapped_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Adjust bubble size
-        bubble_width = min(text_width + 30, max_width)
-        bubble_height = min(text_height + 20, max_height)
-        
-        # Draw speech bubble with white background and black border
-        draw.rounded_rectangle(
-            [bubble_x, bubble_y, bubble_x + bubble_width, bubble_y + bubble_height],
-            radius=15, fill="white", outline="black", width=3
-        )
-        
-        # Add pointer to character
-        pointer_x = bubble_x + 50
-        draw.polygon([
-            pointer_x, bubble_y + bubble_height,
-            pointer_x + 15, bubble_y + bubble_height,
-            pointer_x + 8, bubble_y + bubble_height + 12
-        ], fill="white", outline="black", width=3)
-        
-        # Add text centered in bubble
-        text_x = bubble_x + 15
-        text_y = bubble_y + 10
-        draw.text((text_x, text_y), wrapped_text, fill="black", font=font, align="center")
-        
-        return image
+        # Resized to panel size if needed; wrapping, measuring and drawing are memoized per cleaned text
+        return self.render_assets.caption(image, self._clean_panel_text(text))
     
     def _load_best_font(self, size=12):
-        """Try to load the best available font"""
-        try:
-            return ImageFont.truetype("arial.ttf", size)
-        except:
-            try:
-                return ImageFont.truetype("Arial.ttf", size)
-            except:
-                return ImageFont.load_default()
+        """Best available font, cached by size"""
+        return self.render_assets.font(size)
     
     def _clean_panel_text(self, text):
         """Clean panel text for speech bubbles"""
@@ -243,6 +488,7 @@ class ComicGenerator:
             clean = clean[:117] + "..."
         return clean
     
+    @metrics.timed("image_to_base64")
     def image_to_base64(self, image):
         """Convert PIL image to base64"""
         buffered = BytesIO()
@@ -0,0 +1,205 @@
+import openai
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from incremental_json import IncrementalJSONParser
+from metrics import metrics, bind_context, log
+
+
+class FactAnalyzer:
+    def __init__(self):
+        # "parallel" fires fact-check and mood at once, "fused" asks for both in one call,
+        # "streaming" is parallel with the fact-check fields handed over as they arrive
+        self.mode = os.getenv("ANALYSIS_MODE", "parallel")
+        self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv("ANALYSIS_MAX_WORKERS", "16")),
+                                            thread_name_prefix="analysis")
+
+    @property
+    def streaming(self):
+        return self.mode == "streaming"
+
+    def analyze(self, statement, on_field=None):
+        """Run the whole analysis stage, returns (analysis_json, mood, mood_confidence).
+
+        In streaming mode on_field(key, value) is called from the analysis thread
+        for each fact-check field as soon as it has fully arrived.
+        """
+        if self.mode == "fused":
+            return self.analyze_fused(statement)
+
+        if not self.streaming:
+            on_field = None
+        analysis_future = self._executor.submit(bind_context(self.analyze_statement), statement, on_field)
+        mood_future = self._executor.submit(bind_context(self.detect_mood), statement)
+        mood, mood_confidence = mood_future.result()
+        return analysis_future.result(), mood, mood_confidence
+
+    @metrics.timed("analyze_statement")
+    def analyze_statement(self, statement, on_field=None):
+        """Use OpenAI GPT for fact-checking analysis (streamed when on_field is given)"""
+        try:
+            log(f"🔍 Analyzing statement with OpenAI: {statement}")
+
+            response = openai.ChatCompletion.create(**self._fact_check_params(statement), stream=on_field is not None)
+
+            if on_field is not None:
+                result = self._consume_stream(response, on_field).strip()
+            else:
+                result = response.choices[0].message.content.strip()
+            log(f"✅ OpenAI Response: {result}")
+            return result
+
+        except Exception as e:
+            log(f"❌ OpenAI API error: {e}")
+            return self._fallback_analysis(statement)
+
+    @metrics.timed("detect_mood")
+    def detect_mood(self, statement):
+        """Use OpenAI for mood detection"""
+        try:
+            response = openai.ChatCompletion.create(**self._mood_params(statement))
+            return self._parse_mood(response)
+
+        except Exception as e:
+            log(f"❌ Mood detection error: {e}")
+            return "neutral", 75
+
+    @metrics.timed("analyze_fused")
+    def analyze_fused(self, statement):
+        """Fact-check and mood in a single structured-output call"""
+        try:
+            log(f"🔍 Analyzing statement + mood with OpenAI: {statement}")
+
+            response = openai.ChatCompletion.create(**self._fused_params(statement))
+            return self._split_fused(response)
+
+        except Exception as e:
+            log(f"❌ OpenAI API error: {e}")
+            return self._fallback_analysis(statement), "neutral", 75
+
+    async def analyze_async(self, statement):
+        """analyze() for the ASGI app: awaits OpenAI instead of blocking a thread"""
+        if self.mode == "fused":
+            return await self.analyze_fused_async(statement)
+
+        analysis, (mood, mood_confidence) = await asyncio.gather(
+            self.analyze_statement_async(statement), self.detect_mood_async(statement))
+        return analysis, mood, mood_confidence
+
+    @metrics.timed_async("analyze_statement")
+    async def analyze_statement_async(self, statement):
+        try:
+            log(f"🔍 Analyzing statement with OpenAI: {statement}")
+            response = await openai.ChatCompletion.acreate(**self._fact_check_params(statement))
+            result = response.choices[0].message.content.strip()
+            log(f"✅ OpenAI Response: {result}")
+            return result
+        except Exception as e:
+            log(f"❌ OpenAI API error: {e}")
+            return self._fallback_analysis(statement)
+
+    @metrics.timed_async("detect_mood")
+    async def detect_mood_async(self, statement):
+        try:
+            response = await openai.ChatCompletion.acreate(**self._mood_params(statement))
+            return self._parse_mood(response)
+        except Exception as e:
+            log(f"❌ Mood detection error: {e}")
+            return "neutral", 75
+
+    @metrics.timed_async("analyze_fused")
+    async def analyze_fused_async(self, statement):
+        try:
+            log(f"🔍 Analyzing statement + mood with OpenAI: {statement}")
+            response = await openai.ChatCompletion.acreate(**self._fused_params(statement))
+            return self._split_fused(response)
+        except Exception as e:
+            log(f"❌ OpenAI API error: {e}")
+            return self._fallback_analysis(statement), "neutral", 75
+
+    def _fact_check_params(self, statement):
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": """You are a professional fact-checker. Analyze statements and return ONLY valid JSON:
+                    {
+                        "verdict": "true/false/unverified",
+                        "confidence": 0-100,
+                        "description": "brief factual explanation",
+                        "story": "engaging story for comic panels"
+                    }"""},
+                {"role": "user", "content": f"Fact-check: \"{statement}\""}
+            ],
+            temperature=0.3,
+            max_tokens=400
+        )
+
+    def _mood_params(self, statement):
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "Analyze mood. Return JSON: {\"mood\": \"neutral/positive/negative/serious\", \"confidence\": 0-100}"},
+                {"role": "user", "content": f"Statement: \"{statement}\""}
+            ],
+            temperature=0.1,
+            max_tokens=80
+        )
+
+    def _fused_params(self, statement):
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": """You are a professional fact-checker. Analyze statements and return ONLY valid JSON:
+                    {
+                        "verdict": "true/false/unverified",
+                        "confidence": 0-100,
+                        "description": "brief factual explanation",
+                        "story": "engaging story for comic panels",
+                        "mood": "neutral/positive/negative/serious",
+                        "mood_confidence": 0-100
+                    }"""},
+                {"role": "user", "content": f"Fact-check: \"{statement}\""}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.3,
+            max_tokens=450
+        )
+
+    def _parse_mood(self, response):
+        mood_data = json.loads(response.choices[0].message.content.strip())
+        return mood_data.get("mood", "neutral"), mood_data.get("confidence", 75)
+
+    def _split_fused(self, response):
+        result = json.loads(response.choices[0].message.content.strip())
+        log(f"✅ OpenAI Response: {result}")
+        mood = result.pop("mood", "neutral")
+        mood_confidence = result.pop("mood_confidence", 75)
+        return json.dumps(result), mood, mood_confidence
+
+    def _consume_stream(self, response, on_field):
+        """Collect a streamed completion, passing each finished top-level field to on_field"""
+        parser = IncrementalJSONParser()
+        parts = []
+        for chunk in response:
+            piece = chunk.choices[0].delta.get("content") or ""
+            parts.append(piece)
+            for key, value in parser.feed(piece):
+                on_field(key, value)
+        return "".join(parts)
+
+    def _fallback_analysis(self, statement):
+        """Analysis used when OpenAI is unavailable"""
+        return json.dumps({
+            "verdict": "unverified",
+            "confidence": 50,
+            "description": "Unable to verify at this time.",
+            "story": f"Let's explore the statement: '{statement}'. We're checking facts and sources to determine the truth.",
+            "fallback": True
+        })
+
+
+# Create global instance
+fact_analyzer = FactAnalyzer()
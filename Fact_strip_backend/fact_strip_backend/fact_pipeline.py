@@ -0,0 +1,401 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from comic_generator import comic_generator
+from story_processor import story_processor
+from fact_analyzer import fact_analyzer
+from result_cache import result_cache
+from history_store import history_store
+from claim_index import claim_index
+from admission import admission
+from single_flight import single_flight, FlightTimeout
+from metrics import metrics, bind_context, log
+
+
+class PipelineError(Exception):
+    """A request that can't produce a result, carries the HTTP status to return"""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class StreamedAnalysis:
+    """Acts on fact-check fields while the completion is still streaming.
+
+    Publishes a "verdict" event once verdict, confidence and description are in,
+    and starts the comic (at `tier`) as soon as the story is complete. Panels that
+    finish before the "analysis" event has gone out are held back until it has.
+    """
+
+    verdict_fields = ("verdict", "confidence", "description")
+
+    def __init__(self, pipeline, statement, style, emit, tier="final"):
+        self.pipeline = pipeline
+        self.statement = statement
+        self.style = style
+        self.emit = emit
+        self.tier = tier
+        self.started_at = time.perf_counter()
+        self.fields = {}
+        self.panels = None
+        self.comic = None
+        self.cancelled = threading.Event()
+        self._verdict_sent = False
+        self._analysis_sent = False
+        self._held_panels = []
+        self._lock = threading.Lock()
+
+    def on_field(self, key, value):
+        self.fields[key] = value
+        try:
+            if not self._verdict_sent and all(field in self.fields for field in self.verdict_fields):
+                self._verdict_sent = True
+                metrics.stage_seconds.observe(time.perf_counter() - self.started_at, stage="time_to_verdict")
+                self.emit("verdict", {field: self.fields[field] for field in self.verdict_fields})
+
+            if self.comic is None and all(field in self.fields for field in ("verdict", "confidence", "story")):
+                with metrics.span("split_into_panels"):
+                    self.panels = story_processor.split_into_panels(
+                        self.statement, self.fields["verdict"], self.fields["confidence"], self.fields["story"])
+                log("🚀 Story streamed in, starting the comic early")
+                self.comic = self.pipeline._comic_executor.submit(
+                    bind_context(self.pipeline.generate_comic),
+                    self.panels, self.style, self.statement, on_panel=self.on_panel, tier=self.tier,
+                    cancel=self.cancelled
+                )
+        except Exception as e:
+            # Fall back to the regular path once the whole completion is in
+            log(f"❌ Streamed field error: {e}")
+
+    def matches(self, result):
+        """Whether the early comic was drawn from the same fields as the final result"""
+        return self.comic is not None and all(
+            self.fields.get(field) == result[field] for field in ("verdict", "confidence", "story"))
+
+    def discard(self):
+        """Stop the early comic, the final result isn't what it was drawn from"""
+        if self.comic is None:
+            return
+        log("🛑 Streamed analysis didn't hold up, dropping the early comic")
+        self.cancelled.set()
+        self.comic.cancel()  # Never starts if it's still waiting for a comic thread
+
+    def on_panel(self, index, image):
+        with self._lock:
+            if not self._analysis_sent:
+                self._held_panels.append((index, image))
+                return
+        self.emit("panel", self.pipeline._panel_event(index, image, self.tier))
+
+    def analysis_sent(self):
+        with self._lock:
+            self._analysis_sent = True
+            held, self._held_panels = self._held_panels, []
+        for index, image in held:
+            self.emit("panel", self.pipeline._panel_event(index, image, self.tier))
+
+
+class FactPipeline:
+    required_fields = ["verdict", "description", "story", "confidence"]
+
+    def __init__(self):
+        # Comics started mid-stream run here while the analysis thread finishes up
+        self._comic_executor = ThreadPoolExecutor(max_workers=int(os.getenv("COMIC_MAX_WORKERS", "16")),
+                                                  thread_name_prefix="comic")
+
+    @metrics.timed("pipeline")
+    def run(self, statement, style, on_event=None, priority="interactive"):
+        """Fact-check a statement and draw its comic, returns the API response dict.
+
+        on_event(name, data) gets an "analysis" event as soon as the verdict is
+        known and then one "panel" event per finished panel. In streaming mode a
+        "verdict" event comes first, while the rest of the completion is arriving.
+
+        With progressive rendering on (and someone listening) the panels are drawn
+        twice: quick preview panels, then a "preview" event with the whole preview
+        response, then full-quality panels replacing them one by one. The return
+        value has the refined panels.
+
+        Identical requests already in flight are joined rather than repeated, and
+        cached answers are replayed. Only a request that really runs the pipeline
+        goes through admission control (at `priority`): it may wait for a slot,
+        be answered text-only with fallback panels (never cached), or raise
+        AdmissionRejected.
+        """
+        emit = on_event or (lambda name, data: None)
+
+        def relabel(name, data):
+            # A joined request gets the leader's events, phrased the way it asked
+            if name in ("analysis", "preview"):
+                data = dict(data, original_statement=statement)
+            emit(name, data)
+
+        progressive = comic_generator.progressive and on_event is not None
+        key = result_cache.make_key(statement, style)
+        try:
+            response_data, followed = single_flight.run(
+                key, lambda publish: self._run_once(key, statement, style, publish, progressive, priority),
+                relabel)
+        except FlightTimeout as e:
+            raise PipelineError(f"Timed out waiting for an identical request: {e}", 504)
+        if followed:
+            response_data = dict(response_data, original_statement=statement)
+            self._record_history(response_data)
+        return response_data
+
+    def _run_once(self, key, statement, style, emit, progressive=False, priority="interactive"):
+        with single_flight.process_lock(key):
+            cached = self._lookup_cached(statement, style)
+            if cached is not None:
+                return self._replay_cached(cached, statement, emit)
+            with admission.admit(priority) as text_only:
+                return self._run_uncoalesced(statement, style, emit, progressive and not text_only, text_only)
+
+    def _run_uncoalesced(self, statement, style, emit, progressive=False, text_only=False):
+        started_at = time.perf_counter()
+        first_tier = "preview" if progressive else "final"
+
+        # Run AI analysis (fact-check and mood together)
+        streaming = fact_analyzer.streaming and not text_only
+        streamed = StreamedAnalysis(self, statement, style, emit, first_tier) if streaming else None
+        try:
+            analysis, mood, mood_confidence = fact_analyzer.analyze(
+                statement, on_field=streamed.on_field if streamed else None)
+            result = self._parse_analysis(analysis)
+        except Exception:
+            if streamed is not None:
+                streamed.discard()
+            raise
+        log(f"🎭 Mood: {mood} ({mood_confidence}%)")
+
+        early_comic = streamed is not None and streamed.matches(result)
+        if streamed is not None and not early_comic:
+            streamed.discard()
+        if early_comic:
+            panels = streamed.panels
+        else:
+            # Prepare panels text (for reference)
+            with metrics.span("split_into_panels"):
+                panels = story_processor.split_into_panels(
+                    statement,
+                    result["verdict"],
+                    result["confidence"],
+                    result["story"]
+                )
+        log(f"📝 Generated panel dialogues: {panels}")
+
+        response_data = self._build_response(result, mood, mood_confidence, panels, statement, style)
+        if text_only:
+            response_data["text_only"] = True
+        emit("analysis", self._analysis_event(response_data))
+
+        if text_only:
+            response_data["panel_images"] = self._text_only_panels(panels, style, emit)
+            self._record_history(response_data)
+            return response_data
+
+        # Generate comic - 4 PANEL IMAGES
+        if early_comic:
+            streamed.analysis_sent()
+            response_data["panel_images"], fell_back = streamed.comic.result()
+        else:
+            response_data["panel_images"], fell_back = self.generate_comic(
+                panels, style, statement,
+                on_panel=lambda i, image: emit("panel", self._panel_event(i, image, first_tier)),
+                tier=first_tier
+            )
+
+        if progressive:
+            # The preview is the answer for now, the refined panels replace it under the same job
+            metrics.stage_seconds.observe(time.perf_counter() - started_at, stage="time_to_preview")
+            emit("preview", dict(response_data, preview=True))
+            response_data["panel_images"], fell_back = self.generate_comic(
+                panels, style, statement,
+                on_panel=lambda i, image: emit("panel", self._panel_event(i, image, "final")),
+                previous=response_data["panel_images"]
+            )
+
+        self._store(statement, style, result, response_data, fell_back)
+        return response_data
+
+    @metrics.timed_async("pipeline")
+    async def run_async(self, statement, style, priority="interactive"):
+        """run() for the ASGI app: awaits OpenAI and Replicate, blocking work goes to threads"""
+        key = result_cache.make_key(statement, style)
+        try:
+            response_data, followed = await single_flight.run_async(
+                key, lambda: self._run_once_async(key, statement, style, priority))
+        except FlightTimeout as e:
+            raise PipelineError(f"Timed out waiting for an identical request: {e}", 504)
+        if followed:
+            response_data = dict(response_data, original_statement=statement)
+            await asyncio.to_thread(self._record_history, response_data)
+        return response_data
+
+    async def _run_once_async(self, key, statement, style, priority="interactive"):
+        lock = single_flight.process_lock(key)
+        await asyncio.to_thread(lock.acquire)
+        try:
+            cached = await asyncio.to_thread(self._lookup_cached, statement, style)
+            if cached is not None:
+                return await asyncio.to_thread(self._replay_cached, cached, statement, lambda name, data: None)
+            async with admission.admit_async(priority) as text_only:
+                return await self._run_uncoalesced_async(statement, style, text_only)
+        finally:
+            lock.release()
+
+    async def _run_uncoalesced_async(self, statement, style, text_only=False):
+        analysis, mood, mood_confidence = await fact_analyzer.analyze_async(statement)
+        result = self._parse_analysis(analysis)
+        log(f"🎭 Mood: {mood} ({mood_confidence}%)")
+
+        with metrics.span("split_into_panels"):
+            panels = story_processor.split_into_panels(
+                statement, result["verdict"], result["confidence"], result["story"])
+        log(f"📝 Generated panel dialogues: {panels}")
+
+        response_data = self._build_response(result, mood, mood_confidence, panels, statement, style)
+        if text_only:
+            response_data["text_only"] = True
+            response_data["panel_images"] = await asyncio.to_thread(
+                self._text_only_panels, panels, style, lambda name, data: None)
+            await asyncio.to_thread(self._record_history, response_data)
+            return response_data
+
+        try:
+            response_data["panel_images"], fell_back = await comic_generator.generate_comic_panels_async(
+                style, panels, statement)
+        except Exception as e:
+            log(f"❌ Comic generation error: {e}")
+            traceback.print_exc()
+            response_data["panel_images"] = await asyncio.to_thread(
+                lambda: [comic_generator._create_fallback_panel(panel, style, i) for i, panel in enumerate(panels)])
+            fell_back = set(range(len(panels)))
+
+        await asyncio.to_thread(self._store, statement, style, result, response_data, fell_back)
+        return response_data
+
+    def _lookup_cached(self, statement, style):
+        """An earlier result for this statement (or a reworded one), or None"""
+        cached = result_cache.get(statement, style)
+        if cached is not None:
+            log("⚡ Result cache hit")
+        elif claim_index is not None:
+            # A reworded claim we've already checked gets the same verdict and panels
+            with metrics.span("claim_lookup"):
+                cached = claim_index.lookup(statement, style)
+        return cached
+
+    def _replay_cached(self, cached, statement, emit):
+        response_data = dict(cached, original_statement=statement)
+        emit("analysis", self._analysis_event(response_data))
+        for i, image in enumerate(response_data["panel_images"]):
+            emit("panel", {"index": i, "image": image})
+        self._record_history(response_data)
+        return response_data
+
+    def _parse_analysis(self, analysis):
+        """Parse and validate the fact-check JSON, raises PipelineError if it's unusable"""
+        if not analysis:
+            raise PipelineError("Analysis failed")
+
+        # Parse response
+        try:
+            result = json.loads(analysis)
+        except json.JSONDecodeError as e:
+            log(f"❌ JSON parse error: {e}")
+            raise PipelineError("Invalid analysis format")
+
+        # Validate fields
+        for field in self.required_fields:
+            if field not in result:
+                raise PipelineError(f"Missing field: {field}")
+        return result
+
+    def _build_response(self, result, mood, mood_confidence, panels, statement, style):
+        return {
+            "verdict": result["verdict"],
+            "confidence": result["confidence"],
+            "description": result["description"],
+            "story": result["story"],
+            "mood": mood,
+            "mood_confidence": mood_confidence,
+            "panel_images": [],
+            "panels": panels,
+            "original_statement": statement,
+            "style": style,
+            "success": True
+        }
+
+    def _store(self, statement, style, result, response_data, fell_back=()):
+        """Cache and index a finished response, unless OpenAI or any panel fell back"""
+        # Don't pin an "unable to verify" answer or placeholder panels while a provider is down
+        if result.get("fallback"):
+            log("⚠️ Fallback analysis, not caching the result")
+        elif fell_back:
+            log(f"⚠️ Panels {sorted(i + 1 for i in fell_back)} fell back, not caching the result")
+        else:
+            result_cache.set(statement, style, response_data)
+            if claim_index is not None:
+                claim_index.add(statement, style, response_data)
+        self._record_history(response_data)
+
+    def generate_comic(self, panels, style, statement, on_panel=None, tier="final", previous=None, cancel=None):
+        """Generate a complete 4-panel comic with separate images (refining `previous` if given).
+
+        Returns (panel URLs, fell_back), fell_back being the indices without a fresh render.
+        """
+        try:
+            return comic_generator.generate_comic_panels(style, panels, statement, on_panel=on_panel,
+                                                         tier=tier, previous=previous, cancel=cancel)
+        except Exception as e:
+            log(f"❌ Comic generation error: {e}")
+            traceback.print_exc()
+            # Fallback - keep the preview if there is one, otherwise 4 fallback panels
+            fell_back = set(range(len(panels)))
+            if previous:
+                return previous, fell_back
+            panel_images = [comic_generator._create_fallback_panel(panel, style, i) for i, panel in enumerate(panels)]
+            if on_panel:
+                for i, image in enumerate(panel_images):
+                    on_panel(i, image)
+            return panel_images, fell_back
+
+    def _text_only_panels(self, panels, style, emit):
+        """Fallback panels carrying the dialogue, for answers that skip Replicate"""
+        panel_images = []
+        for i, panel in enumerate(panels):
+            panel_images.append(comic_generator._create_fallback_panel(panel, style, i))
+            emit("panel", self._panel_event(i, panel_images[i]))
+        return panel_images
+
+    def _record_history(self, response_data):
+        """Keep the result in the server-side history, never failing the request over it"""
+        if history_store is None:
+            return
+        try:
+            with metrics.span("history_record"):
+                history_store.record(response_data)
+        except Exception as e:
+            log(f"❌ History write error: {e}")
+
+    def _panel_event(self, index, image, tier="final"):
+        """Panel events name their tier only when there is more than one"""
+        if comic_generator.progressive:
+            return {"index": index, "image": image, "tier": tier}
+        return {"index": index, "image": image}
+
+    def _analysis_event(self, response_data):
+        """Everything in the response except the images"""
+        return {key: value for key, value in response_data.items() if key != "panel_images"}
+
+
+# Create global instance
+fact_pipeline = FactPipeline()
@@ -0,0 +1,165 @@
+import json
+import os
+import sqlite3
+import time
+
+from metrics import log, current_request_id
+from sqlite_connections import SqliteConnections
+
+
+class HistoryStore:
+    """Every fact-check result, with keyset pagination, full-text search and running totals.
+
+    Pages are ordered by id (newest first) and the cursor is the last id seen, so
+    fetching page N costs the same as page 1. Analytics are counters bumped in the
+    same transaction as each insert rather than scans over the table.
+    """
+
+    summary_columns = "id, created_at, statement, verdict, confidence, style, mood"
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = SqliteConnections(path, row_factory=sqlite3.Row)
+        with self._connections.get() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS checks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                statement TEXT NOT NULL,
+                verdict TEXT,
+                confidence INTEGER,
+                style TEXT,
+                mood TEXT,
+                request_id TEXT,
+                result TEXT NOT NULL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_checks_created ON checks(created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_checks_verdict ON checks(verdict, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_checks_style ON checks(style, id)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS check_counts (
+                dimension TEXT NOT NULL,
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (dimension, value)
+            )""")
+            self.fts_enabled = self._create_fts(conn)
+
+    def _create_fts(self, conn):
+        """External-content FTS5 index over statements, kept in sync by a trigger"""
+        try:
+            conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS checks_fts
+                            USING fts5(statement, content='checks', content_rowid='id')""")
+            conn.execute("""CREATE TRIGGER IF NOT EXISTS checks_fts_insert AFTER INSERT ON checks BEGIN
+                INSERT INTO checks_fts(rowid, statement) VALUES (new.id, new.statement);
+            END""")
+            return True
+        except sqlite3.OperationalError as e:
+            log(f"⚠️ SQLite has no FTS5, history search falls back to LIKE: {e}")
+            return False
+
+    def record(self, result):
+        """Store one API response and bump the analytics counters, returns the new id"""
+        now = time.time()
+        verdict = result.get("verdict")
+        style = result.get("style")
+        with self._connections.get() as conn:
+            cursor = conn.execute(
+                """INSERT INTO checks (created_at, statement, verdict, confidence, style, mood, request_id, result)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (now, result.get("original_statement", ""), verdict, result.get("confidence"), style,
+                 result.get("mood"), current_request_id(), json.dumps(result))
+            )
+            counts = [("total", ""), ("verdict", verdict or "unknown"), ("style", style or "unknown"),
+                      ("day", time.strftime("%Y-%m-%d", time.gmtime(now)))]
+            conn.executemany("""INSERT INTO check_counts (dimension, value, count) VALUES (?, ?, 1)
+                                ON CONFLICT(dimension, value) DO UPDATE SET count = count + 1""", counts)
+            return cursor.lastrowid
+
+    def list(self, cursor=None, limit=20, verdict=None, style=None, since=None, until=None):
+        """One page of summaries, newest first, plus the cursor for the next page"""
+        clauses, params = self._filters(cursor, verdict, style, since, until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connections.get().execute(
+            f"SELECT {self.summary_columns} FROM checks {where} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        return self._page(rows, limit)
+
+    def search(self, query, cursor=None, limit=20, verdict=None, style=None):
+        """Statements matching every word of the query, newest first"""
+        clauses, params = self._filters(cursor, verdict, style, None, None)
+        terms = query.split()
+        if self.fts_enabled:
+            # Quote each word so user input can't be read as FTS syntax
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            clauses.append("id IN (SELECT rowid FROM checks_fts WHERE checks_fts MATCH ?)")
+            params.append(match)
+        else:
+            for term in terms:
+                clauses.append("statement LIKE ?")
+                params.append(f"%{term}%")
+        rows = self._connections.get().execute(
+            f"SELECT {self.summary_columns} FROM checks WHERE {' AND '.join(clauses)} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        return self._page(rows, limit)
+
+    def get(self, check_id):
+        """The full stored response for one check, or None"""
+        row = self._connections.get().execute(
+            "SELECT id, created_at, result FROM checks WHERE id = ?", (check_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(json.loads(row["result"]), id=row["id"], created_at=row["created_at"])
+
+    def analytics(self, days=30):
+        """Totals by verdict and style, and per-day counts for the last `days` days"""
+        rows = self._connections.get().execute("SELECT dimension, value, count FROM check_counts").fetchall()
+        grouped = {"verdict": {}, "style": {}, "day": {}}
+        total = 0
+        for row in rows:
+            if row["dimension"] == "total":
+                total = row["count"]
+            else:
+                grouped[row["dimension"]][row["value"]] = row["count"]
+        recent_days = sorted(grouped["day"].items())[-days:] if days else []
+        return {
+            "total_checks": total,
+            "by_verdict": grouped["verdict"],
+            "by_style": grouped["style"],
+            "by_day": dict(recent_days)
+        }
+
+    def _filters(self, cursor, verdict, style, since, until):
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(int(cursor))
+        if verdict:
+            clauses.append("verdict = ?")
+            params.append(verdict)
+        if style:
+            clauses.append("style = ?")
+            params.append(style)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(float(since))
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(float(until))
+        return clauses, params
+
+    def _page(self, rows, limit):
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = str(items[-1]["id"]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+
+def _create_history_store():
+    if os.getenv("HISTORY_BACKEND", "sqlite") != "sqlite":
+        return None  # "off"
+    return HistoryStore(os.getenv("HISTORY_DB_PATH", "history.db"))
+
+
+# Create global instance
+history_store = _create_history_store()
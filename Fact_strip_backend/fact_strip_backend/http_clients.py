@@ -0,0 +1,264 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import httpx
+import requests
+from replicate import Client
+from replicate.client import RetryTransport
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from circuit_breaker import circuit_breakers, CircuitOpenError
+from metrics import metrics, bind_context, log
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight calls and spaces out their starts to stay under a rate limit"""
+
+    def __init__(self, max_concurrency, max_per_second):
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._min_interval = 1.0 / max_per_second if max_per_second > 0 else 0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        if self._min_interval:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self._min_interval
+            if start > now:
+                time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._semaphore.release()
+
+
+class AsyncConcurrencyLimiter:
+    """ConcurrencyLimiter for coroutines: waits without holding a thread"""
+
+    def __init__(self, max_concurrency, max_per_second):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._min_interval = 1.0 / max_per_second if max_per_second > 0 else 0
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        if self._min_interval:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._min_interval
+            if start > now:
+                await asyncio.sleep(start - now)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+
+class HttpClients:
+    """Shared, thread-safe HTTP clients for Replicate and image downloads"""
+
+    def __init__(self):
+        self.connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+        self.max_retries = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+        self.backoff_factor = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+        self.pool_size = int(os.getenv("HTTP_POOL_SIZE", "32"))
+        self.replicate_limiter = ConcurrencyLimiter(
+            int(os.getenv("REPLICATE_MAX_CONCURRENCY", "8")),
+            float(os.getenv("REPLICATE_MAX_PER_SECOND", "5"))
+        )
+        # Optional hedging: a second prediction if the first outlives the recent p95
+        self.hedge_enabled = os.getenv("HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.hedge_min_delay = float(os.getenv("HEDGE_MIN_DELAY", "5"))
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("REPLICATE_MAX_CONCURRENCY", "8")) * 2, thread_name_prefix="hedge")
+        # The ASGI app has its own budget, it can't share a lock with blocking threads
+        self.async_replicate_limiter = AsyncConcurrencyLimiter(
+            int(os.getenv("REPLICATE_MAX_CONCURRENCY", "8")),
+            float(os.getenv("REPLICATE_MAX_PER_SECOND", "5"))
+        )
+        self._session = None
+        self._replicate_client = None
+        self._async_session = None
+        self._async_replicate_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Pooled keep-alive session for downloads, retries GETs on 429/5xx"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    retry = Retry(
+                        total=self.max_retries,
+                        backoff_factor=self.backoff_factor,
+                        status_forcelist=(429, 500, 502, 503, 504),
+                        allowed_methods=frozenset(["GET", "HEAD"]),
+                        respect_retry_after_header=True
+                    )
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retry)
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def replicate(self):
+        """One Replicate client (and connection pool) shared by every panel"""
+        if self._replicate_client is None:
+            with self._lock:
+                if self._replicate_client is None:
+                    transport = httpx.HTTPTransport(
+                        limits=httpx.Limits(max_connections=self.pool_size,
+                                            max_keepalive_connections=self.pool_size),
+                        retries=self.max_retries  # connection errors only
+                    )
+                    # The client already retries polling GETs, this adds backoff for
+                    # prediction creates that were rejected before any work started
+                    transport = RetryTransport(
+                        wrapped_transport=transport,
+                        max_attempts=self.max_retries + 1,
+                        backoff_factor=self.backoff_factor,
+                        retryable_methods=["POST"],
+                        retry_status_codes=[429, 503]
+                    )
+                    self._replicate_client = Client(
+                        api_token=os.environ.get("REPLICATE_API_TOKEN"),
+                        timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                        transport=transport
+                    )
+        return self._replicate_client
+
+    def run_replicate(self, model, input_params):
+        """Run a Replicate model behind its circuit breaker, hedged if enabled"""
+        breaker = circuit_breakers.get(model)
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuit open for {model}")
+
+        start = time.monotonic()
+        try:
+            hedge_delay = self._hedge_delay(breaker)
+            if hedge_delay is None:
+                output = self._run_limited(model, input_params)
+            else:
+                output = self._run_hedged(model, input_params, hedge_delay)
+        except Exception:
+            breaker.record(False, time.monotonic() - start)
+            raise
+        breaker.record(True, time.monotonic() - start)
+        return output
+
+    def _run_limited(self, model, input_params):
+        with self.replicate_limiter:
+            return self.replicate.run(model, input=input_params)
+
+    def _hedge_delay(self, breaker):
+        if not self.hedge_enabled or breaker.state != "closed":
+            return None
+        p95 = breaker.latency_percentile(95)
+        return max(self.hedge_min_delay, p95) if p95 is not None else None
+
+    def _run_hedged(self, model, input_params, delay):
+        """Start a second identical prediction if the first is still running after `delay`.
+
+        The slower prediction is not cancelled (client.run has no handle for it), so a
+        hedge costs one extra prediction; keep HEDGE_MIN_DELAY high enough to make it rare.
+        """
+        primary = self._hedge_executor.submit(bind_context(self._run_limited), model, input_params)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        log(f"🏇 Prediction still running after {delay:.1f}s, sending a hedge")
+        metrics.hedges.inc(outcome="launched")
+        hedge = self._hedge_executor.submit(bind_context(self._run_limited), model, input_params)
+        errors = []
+        for future in as_completed([primary, hedge]):
+            if future.exception() is None:
+                if future is hedge:
+                    metrics.hedges.inc(outcome="won")
+                return future.result()
+            errors.append(future.exception())
+        raise errors[0]
+
+    @property
+    def async_session(self):
+        """Pooled httpx.AsyncClient for downloads from the ASGI app's event loop"""
+        if self._async_session is None:
+            self._async_session = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=self.max_retries)  # connection errors only
+            )
+        return self._async_session
+
+    @property
+    def async_replicate(self):
+        """Replicate client for async_run (the sync client's transport can't serve coroutines)"""
+        if self._async_replicate_client is None:
+            transport = RetryTransport(
+                wrapped_transport=httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                    retries=self.max_retries
+                ),
+                max_attempts=self.max_retries + 1,
+                backoff_factor=self.backoff_factor,
+                retryable_methods=["POST"],
+                retry_status_codes=[429, 503]
+            )
+            self._async_replicate_client = Client(
+                api_token=os.environ.get("REPLICATE_API_TOKEN"),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                transport=transport
+            )
+        return self._async_replicate_client
+
+    async def run_replicate_async(self, model, input_params):
+        """run_replicate() for coroutines, behind the same circuit breaker (no hedging)"""
+        breaker = circuit_breakers.get(model)
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuit open for {model}")
+
+        start = time.monotonic()
+        try:
+            async with self.async_replicate_limiter:
+                output = await self.async_replicate.async_run(model, input=input_params)
+        except Exception:
+            breaker.record(False, time.monotonic() - start)
+            raise
+        breaker.record(True, time.monotonic() - start)
+        return output
+
+    async def download_async(self, url):
+        """download() for coroutines, retries 429/5xx with the same backoff as the session"""
+        for attempt in range(self.max_retries + 1):
+            response = await self.async_session.get(url)
+            if response.status_code not in (429, 500, 502, 503, 504) or attempt == self.max_retries:
+                break
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+        response.raise_for_status()
+        return response.content
+
+    async def aclose(self):
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
+
+    def download(self, url):
+        """Fetch a URL over the shared session, returns the raw bytes"""
+        response = self.session.get(url, timeout=(self.connect_timeout, self.read_timeout))
+        response.raise_for_status()
+        return response.content
+
+
+# Create global instance
+http_clients = HttpClients()
@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+
+from metrics import metrics
+
+
+class ImageStore:
+    """Content-addressed store for finished panels, served by GET /api/images/<name>"""
+
+    formats = {
+        "webp": ("WEBP", "image/webp"),
+        "jpeg": ("JPEG", "image/jpeg"),
+        "png": ("PNG", "image/png"),
+    }
+    name_pattern = re.compile(r"^[0-9a-f]{64}\.(webp|jpeg|png)$")
+
+    def __init__(self, directory, image_format="webp", quality=85, delivery="url", base_url=""):
+        self.directory = directory
+        image_format = {"jpg": "jpeg"}.get(image_format, image_format)
+        self.image_format = image_format if image_format in self.formats else "webp"
+        self.quality = quality
+        # "url" returns links to the store, "inline" keeps base64 data URLs in the JSON
+        self.delivery = delivery
+        self.base_url = base_url.rstrip("/")
+        if self.delivery == "url":
+            os.makedirs(self.directory, exist_ok=True)
+
+    def encode(self, image):
+        """Encode a PIL image in the configured format, returns (bytes, mimetype)"""
+        pil_format, mimetype = self.formats[self.image_format]
+        if pil_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        buffered = BytesIO()
+        if pil_format == "PNG":
+            image.save(buffered, format="PNG", optimize=False)
+        else:
+            image.save(buffered, format=pil_format, quality=self.quality)
+        return buffered.getvalue(), mimetype
+
+    @metrics.timed("image_encode")
+    def publish(self, image):
+        """Store a finished panel and return the string the frontend puts in <img src>"""
+        return self.store(image)
+
+    def store(self, image):
+        """publish() without the timing, for render workers that report it to the parent"""
+        data, mimetype = self.encode(image)
+        if self.delivery == "inline":
+            return f"data:{mimetype};base64,{base64.b64encode(data).decode()}"
+
+        name = self.save_bytes(data, self.image_format)
+        return f"{self.base_url}/api/images/{name}"
+
+    def save_bytes(self, data, extension):
+        """Write encoded bytes once under their content hash, returns the file name"""
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return name
+
+    def is_valid_name(self, name):
+        return bool(self.name_pattern.match(name))
+
+
+# Create global instance
+image_store = ImageStore(
+    os.getenv("IMAGE_STORE_DIR", "image_store"),
+    image_format=os.getenv("IMAGE_FORMAT", "webp").lower(),
+    quality=int(os.getenv("IMAGE_QUALITY", "85")),
+    delivery=os.getenv("IMAGE_DELIVERY", "url"),
+    base_url=os.getenv("IMAGE_BASE_URL", "")
+)
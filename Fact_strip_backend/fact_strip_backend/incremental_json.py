@@ -0,0 +1,115 @@
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """Picks complete top-level fields out of a JSON object that arrives in pieces.
+
+    feed() takes the next chunk of text and returns the (key, value) pairs that
+    finished inside it, in document order. Anything before the opening brace
+    (a ```json fence, stray whitespace) is skipped. Nested values are passed to
+    json.loads whole once their closing bracket arrives.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._state = "start"  # start -> key -> colon -> value -> comma ... -> done
+        self._key = None
+        self._value_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        fields = []
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            ch = text[self._pos]
+
+            if self._state == "start":
+                if ch == "{":
+                    self._state = "key"
+            elif self._state == "key":
+                if ch == '"':
+                    end = self._string_end(text, self._pos)
+                    if end is None:
+                        return fields  # key still arriving, rescan it next time
+                    self._key = json.loads(text[self._pos:end + 1])
+                    self._pos = end
+                    self._state = "colon"
+                elif ch == "}":
+                    self.done = True
+            elif self._state == "colon":
+                if ch == ":":
+                    self._state = "value"
+                    self._value_start = None
+            elif self._state == "value":
+                field = self._scan_value(text, ch)
+                if field is not None:
+                    fields.append(field)
+            elif self._state == "comma":
+                if ch == ",":
+                    self._state = "key"
+                elif ch == "}":
+                    self.done = True
+            self._pos += 1
+        return fields
+
+    def _scan_value(self, text, ch):
+        if self._value_start is None:
+            if ch in WHITESPACE:
+                return None
+            self._value_start = self._pos
+            self._depth = 0
+            self._in_string = False
+            self._escaped = False
+
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    return self._finish_value(text, self._pos + 1, "comma")
+            return None
+
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]" and self._depth > 0:
+            self._depth -= 1
+            if self._depth == 0:
+                return self._finish_value(text, self._pos + 1, "comma")
+        elif self._depth == 0 and (ch in ",}" or ch in WHITESPACE):
+            # A bare number / true / false / null ends at the next delimiter
+            field = self._finish_value(text, self._pos, "key" if ch == "," else "comma")
+            if ch == "}":
+                self.done = True
+            return field
+        return None
+
+    def _finish_value(self, text, end, next_state):
+        value = json.loads(text[self._value_start:end])
+        self._state = next_state
+        self._value_start = None
+        return self._key, value
+
+    def _string_end(self, text, start):
+        """Index of the quote closing the string that opens at `start`, None if not here yet"""
+        escaped = False
+        for index in range(start + 1, len(text)):
+            ch = text[index]
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                return index
+        return None
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import admission, AdmissionRejected
+from fact_pipeline import fact_pipeline, PipelineError
+from metrics import bind_context, log, log_timings
+
+
+class Job:
+    def __init__(self, statement, style):
+        self.id = uuid.uuid4().hex
+        self.statement = statement
+        self.style = style
+        self.status = "queued"  # queued -> running -> (preview ->) done / failed
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []  # (name, data) in the order they happened
+        self.result = None
+        self.preview = None  # the preview response while progressive rendering refines it
+        self.error = None
+        self.error_status = None
+        self.retry_after = None  # set when admission control turned the job away
+        self._changed = threading.Condition()
+
+    def publish(self, name, data):
+        with self._changed:
+            if name == "preview":
+                self.status = "preview"
+                self.preview = data
+            self.events.append((name, data))
+            self._changed.notify_all()
+
+    def finish(self, result=None, error=None, error_status=500, retry_after=None):
+        with self._changed:
+            if error is None:
+                self.status = "done"
+                self.result = result
+                self.events.append(("done", result))
+            else:
+                self.status = "failed"
+                self.error = error
+                self.error_status = error_status
+                self.retry_after = retry_after
+                self.events.append(("error", {"error": error}))
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def wait(self, timeout=None, preview=False):
+        """Block until the job finishes (or, with preview, has a preview), returns False on timeout"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.finished or (preview and self.preview is not None),
+                                          timeout=timeout)
+
+    def wait_for_events(self, since, timeout=None):
+        """Return events after index `since`, waiting up to timeout for new ones"""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > since or self.finished, timeout=timeout)
+            return self.events[since:]
+
+    def snapshot(self):
+        """Current state for polling: whatever is known so far about the result"""
+        with self._changed:
+            partial = {}
+            panel_images = []
+            for name, data in self.events:
+                if name in ("verdict", "analysis"):
+                    partial.update(data)
+                    panel_images = [None] * len(data.get("panels", []))
+                elif name == "preview":
+                    # Refined panels overwrite these as they land
+                    partial.update(data)
+                    panel_images = list(data["panel_images"])
+                elif name == "panel" and data["index"] < len(panel_images):
+                    panel_images[data["index"]] = data["image"]
+            if partial:
+                partial["panel_images"] = panel_images
+
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "created_at": self.created_at,
+                "result": self.result if self.result is not None else partial or None,
+                "error": self.error
+            }
+
+
+class JobManager:
+    """Runs fact-check jobs on a background pool so HTTP workers don't wait on upstreams.
+
+    Jobs live in this process only; with several gunicorn workers, clients must be
+    routed back to the worker that created the job (or run a single worker).
+
+    At most max_backlog jobs wait for a thread, submit() turns the rest away with
+    a 503 rather than queueing them for however long the running ones take.
+    """
+
+    def __init__(self, max_workers=8, max_backlog=8, ttl=3600, retry_after=5):
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.max_backlog = max_backlog
+        self.retry_after = retry_after
+        self._jobs = {}
+        self._outstanding = 0  # submitted and not yet finished running
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, statement, style):
+        """Queue a job, raises AdmissionRejected (503) when the backlog is full"""
+        job = Job(statement, style)
+        with self._lock:
+            if self._outstanding >= self.max_workers + self.max_backlog:
+                log(f"🚫 Job backlog full ({self.max_backlog} waiting), rejecting")
+                raise AdmissionRejected("Server is overloaded, try again shortly", 503, self.retry_after)
+            self._outstanding += 1
+            self._purge_expired()
+            self._jobs[job.id] = job
+        self._executor.submit(bind_context(self._run), job)
+        log(f"📥 Queued job {job.id}: '{statement}' | Style: {style}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        try:
+            job.status = "running"
+            result = fact_pipeline.run(job.statement, job.style, on_event=job.publish)
+            job.finish(result=result)
+            log(f"✅ Job {job.id} completed")
+        except PipelineError as e:
+            job.finish(error=e.message, error_status=e.status)
+        except AdmissionRejected as e:
+            job.finish(error=e.message, error_status=e.status, retry_after=e.retry_after)
+        except Exception as e:
+            log(f"❌ Job {job.id} error: {e}")
+            traceback.print_exc()
+            job.finish(error="Internal server error")
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+            log_timings()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "queued": sum(1 for job in jobs if job.status == "queued"),
+            "running": sum(1 for job in jobs if job.status in ("running", "preview")),
+            "finished": sum(1 for job in jobs if job.finished)
+        }
+
+
+# Create global instance
+job_manager = JobManager(
+    # Enough threads for every request admission control lets in (queued ones wait in
+    # line on a thread) plus as many again for cache hits and joined identical requests
+    max_workers=int(os.getenv("JOB_WORKERS", str(admission.capacity * 2 or 8))),
+    max_backlog=int(os.getenv("JOB_MAX_BACKLOG", str(admission.capacity or 8))),
+    ttl=float(os.getenv("JOB_TTL", "3600")),
+    retry_after=int(os.getenv("JOB_RETRY_AFTER", "5"))
+)
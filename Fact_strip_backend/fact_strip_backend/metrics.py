@@ -0,0 +1,198 @@
+import contextvars
+import functools
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Request id and timing spans follow the request into worker threads via bind_context
+_request_id = contextvars.ContextVar("request_id", default=None)
+_spans = contextvars.ContextVar("spans", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def totals(self):
+        """{labels: (count, sum)} for every series"""
+        with self._lock:
+            return {key: (series[-1], series[-2]) for key, series in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Metrics:
+    """Prometheus-style counters and histograms for the fact-check pipeline"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram("factstrip_stage_duration_seconds",
+                                       "Time spent in each pipeline stage", ["stage"])
+        self.stage_errors = Counter("factstrip_stage_errors_total",
+                                    "Pipeline stages that raised", ["stage"])
+        self.requests = Counter("factstrip_requests_total",
+                                "Fact-check requests by endpoint and outcome", ["endpoint", "status"])
+        self.panels = Counter("factstrip_panels_total",
+                              "Panels produced, by where the image came from", ["source"])
+        self.hedges = Counter("factstrip_replicate_hedges_total",
+                              "Hedged Replicate predictions launched and won", ["outcome"])
+        self.coalesced = Counter("factstrip_coalesced_requests_total",
+                                 "Requests that waited on an identical one instead of running", ["scope"])
+        self.admissions = Counter("factstrip_admissions_total",
+                                  "Admission decisions: active, queued, text_only, expired, displaced, "
+                                  "rejected, rate_limited", ["priority", "outcome"])
+        self._collectors = []
+
+    def register_collector(self, collect):
+        """collect() returns extra (name, type, help, value) samples at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in (self.stage_seconds, self.stage_errors, self.requests, self.panels, self.hedges,
+                       self.coalesced, self.admissions):
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, metric_type, help_text, value in collect():
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+    def timed(self, stage):
+        """Decorator form of span()"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def timed_async(self, stage):
+        """timed() for coroutine functions"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stage_summary(self):
+        """{stage: (count, total_seconds)} across everything recorded so far"""
+        return {dict(key)["stage"]: totals for key, totals in self.stage_seconds.totals().items()}
+
+    @contextmanager
+    def span(self, stage):
+        """Time a block as one pipeline stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.stage_errors.inc(stage=stage)
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, duration):
+        """Record a stage timed elsewhere (e.g. in a render worker process)"""
+        self.stage_seconds.observe(duration, stage=stage)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, duration))
+
+
+def start_request(request_id=None):
+    """Give the current context a request id and a fresh span list, returns the id"""
+    request_id = request_id or uuid.uuid4().hex[:12]
+    _request_id.set(request_id)
+    _spans.set([])
+    return request_id
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def request_spans():
+    """(stage, seconds) pairs recorded so far for the current request"""
+    return list(_spans.get() or [])
+
+
+def bind_context(fn):
+    """Wrap fn so it runs with the caller's request id when handed to a thread pool"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def log(message):
+    """print() with the current request id in front"""
+    request_id = _request_id.get()
+    print(f"[{request_id}] {message}" if request_id else message)
+
+
+def log_timings():
+    """One structured line summarizing where the request spent its time"""
+    spans = request_spans()
+    if spans:
+        log("timings " + " ".join(f"{stage}={duration * 1000:.0f}ms" for stage, duration in spans))
+
+
+# Create global instance
+metrics = Metrics()
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from metrics import log
+
+
+class PanelCache:
+    """Disk cache of raw SDXL panel images, keyed by a hash of the generation params.
+
+    Files are touched on every hit so their mtime doubles as the LRU clock, which
+    keeps eviction correct even when several worker processes share the directory.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self._total_bytes = sum(size for _, _, size in self._scan())
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and self.max_bytes > 0
+
+    def make_key(self, model, input_params):
+        payload = json.dumps({"model": model, "input": input_params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.img")
+
+    def get(self, key):
+        """Return the cached image bytes, or None on a miss"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        try:
+            # Write to a temp file first so readers never see a half-written image
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            log(f"❌ Panel cache write error: {e}")
+            return
+
+        with self._lock:
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".img"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """Drop least recently used files until the cache is back under 90% of its cap"""
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for _, path, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": self._total_bytes
+        }
+
+
+# Create global instance
+panel_cache = PanelCache(
+    os.getenv("PANEL_CACHE_DIR", "panel_cache"),
+    int(float(os.getenv("PANEL_CACHE_MAX_MB", "500")) * 1024 * 1024)
+)
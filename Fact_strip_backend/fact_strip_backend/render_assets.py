@@ -0,0 +1,136 @@
+import functools
+import textwrap
+import threading
+
+from PIL import Image, ImageDraw, ImageFont
+
+
+class RenderAssets:
+    """Fonts, fallback backgrounds and speech bubbles, built once and reused.
+
+    Bubbles are rendered onto a transparent overlay and pasted with their own
+    alpha as the mask, which gives the same pixels as drawing them in place.
+    """
+
+    # Speech bubble position and limits (top of panel)
+    bubble_x, bubble_y = 30, 20
+    bubble_max_width = 340
+    bubble_max_height = 80
+
+    def __init__(self, panel_width, panel_height, bg_colors, font_path=None, memo_size=256):
+        self.panel_width = panel_width
+        self.panel_height = panel_height
+        self.bg_colors = bg_colors
+        self.font_paths = [path for path in (font_path, "arial.ttf", "Arial.ttf") if path]
+        self._fonts = {}
+        self._backgrounds = {}
+        self._lock = threading.Lock()
+        self.bubble_overlay = functools.lru_cache(maxsize=memo_size)(self._render_bubble)
+
+    def preload(self, panel_count=4):
+        """Load the fonts and fallback backgrounds every request will need"""
+        self.font(14)
+        self.font(20)
+        for style in self.bg_colors:
+            for panel_index in range(panel_count):
+                self._fallback_background(style, panel_index)
+
+    def font(self, size):
+        """Best available font at this size, loaded from disk only once"""
+        font = self._fonts.get(size)
+        if font is None:
+            font = self._load_font(size)
+            with self._lock:
+                font = self._fonts.setdefault(size, font)
+        return font
+
+    def _load_font(self, size):
+        for path in self.font_paths:
+            try:
+                return ImageFont.truetype(path, size)
+            except OSError:
+                continue
+        return ImageFont.load_default()
+
+    def caption(self, image, clean_text):
+        """Bring a panel to panel size and paste its speech bubble on it"""
+        if image.size != (self.panel_width, self.panel_height):
+            image = image.resize((self.panel_width, self.panel_height), Image.Resampling.LANCZOS)
+        overlay, position = self.bubble_overlay(clean_text)
+        image.paste(overlay, position, overlay)
+        return image
+
+    def fallback_background(self, style, panel_index):
+        """A fresh copy of the styled fallback panel, border and "Panel N" header included"""
+        return self._fallback_background(style, panel_index).copy()
+
+    def _fallback_background(self, style, panel_index):
+        key = (style, panel_index)
+        background = self._backgrounds.get(key)
+        if background is None:
+            background = self._render_fallback_background(style, panel_index)
+            with self._lock:
+                background = self._backgrounds.setdefault(key, background)
+        return background
+
+    def _render_fallback_background(self, style, panel_index):
+        image = Image.new('RGB', (self.panel_width, self.panel_height), color=(240, 240, 240))
+        draw = ImageDraw.Draw(image)
+
+        bg_color = self.bg_colors.get(style, (240, 240, 240))
+        draw.rectangle([0, 0, self.panel_width, self.panel_height], fill=bg_color)
+
+        # Add panel border
+        draw.rectangle([5, 5, self.panel_width-5, self.panel_height-5], outline="black", width=2)
+
+        # Add panel number
+        draw.text((self.panel_width//2 - 30, 20), f"Panel {panel_index + 1}", fill="black", font=self.font(20))
+        return image
+
+    def _render_bubble(self, clean_text):
+        """Draw the bubble for one cleaned panel string, returns (overlay, paste position)"""
+        font = self.font(14)
+        wrapped_text = textwrap.fill(clean_text, width=30)
+        bubble_x, bubble_y = self.bubble_x, self.bubble_y
+
+        # Calculate text size
+        measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+        bbox = measure.textbbox((0, 0), wrapped_text, font=font)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+
+        # Adjust bubble size
+        bubble_width = min(text_width + 30, self.bubble_max_width)
+        bubble_height = min(text_height + 20, self.bubble_max_height)
+        text_x, text_y = bubble_x + 15, bubble_y + 10
+        pointer_x = bubble_x + 50
+
+        # Long text can spill past the bubble and short bubbles are narrower than
+        # the pointer, so the overlay covers all three
+        text_box = measure.textbbox((text_x, text_y), wrapped_text, font=font, align="center")
+        margin = 4
+        left = min(bubble_x, text_box[0]) - margin
+        top = min(bubble_y, text_box[1]) - margin
+        right = max(bubble_x + bubble_width, pointer_x + 15, text_box[2]) + margin
+        bottom = max(bubble_y + bubble_height + 12, text_box[3]) + margin
+
+        overlay = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(overlay)
+
+        # Draw speech bubble with white background and black border
+        draw.rounded_rectangle(
+            [bubble_x - left, bubble_y - top, bubble_x + bubble_width - left, bubble_y + bubble_height - top],
+            radius=15, fill="white", outline="black", width=3
+        )
+
+        # Add pointer to character
+        draw.polygon([
+            pointer_x - left, bubble_y + bubble_height - top,
+            pointer_x + 15 - left, bubble_y + bubble_height - top,
+            pointer_x + 8 - left, bubble_y + bubble_height + 12 - top
+        ], fill="white", outline="black", width=3)
+
+        # Add text centered in bubble
+        draw.text((text_x - left, text_y - top), wrapped_text, fill="black", font=font, align="center")
+
+        return overlay, (left, top)
@@ -0,0 +1,76 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import render_worker
+from metrics import metrics, log
+
+
+class RenderPool:
+    """Worker processes that caption and encode panels, so PIL work runs on every core.
+
+    The downloaded panel goes to the worker through a shared memory block rather
+    than being pickled down the pipe, and only the published URL comes back.
+    Workers are spawned on first use and rebuilt if one of them dies. Spawned
+    workers import the launching script as __mp_main__, so entry points keep
+    their startup under `if __name__ == "__main__"`.
+    """
+
+    def __init__(self, workers, assets_args):
+        self.workers = workers
+        self.assets_args = assets_args
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                log(f"🏭 Starting {self.workers} render worker processes")
+                # Not fork: the request threads may be holding locks the children would inherit
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=render_worker.init_worker,
+                    initargs=(self.assets_args,)
+                )
+            return self._executor
+
+    def caption_and_publish(self, image_bytes, clean_text, style, panel_index):
+        """Caption raw panel bytes (None for a fallback panel) in a worker, returns the image URL"""
+        shm = None
+        executor = self._get_executor()
+        try:
+            if image_bytes is not None:
+                shm = shared_memory.SharedMemory(create=True, size=len(image_bytes))
+                shm.buf[:len(image_bytes)] = image_bytes
+            with metrics.span("render_worker"):
+                url, timings = executor.submit(
+                    render_worker.caption_and_publish, shm.name if shm else None, len(image_bytes or b""),
+                    clean_text, style, panel_index
+                ).result()
+            for stage, duration in timings.items():
+                metrics.record(stage, duration)
+            return url
+        except BrokenProcessPool:
+            log("❌ A render worker died, restarting the pool")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
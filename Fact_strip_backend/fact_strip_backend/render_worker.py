@@ -0,0 +1,43 @@
+import time
+from io import BytesIO
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+from image_store import image_store
+from render_assets import RenderAssets
+
+# The render pool's worker processes run this module (besides re-importing the
+# launching script), keep it free of app imports (no pipeline, clients or
+# caches) and of work at import time
+
+# Set in each worker process by init_worker
+_assets = None
+
+
+def init_worker(assets_args):
+    global _assets
+    _assets = RenderAssets(**assets_args)
+    _assets.preload()
+
+
+def caption_and_publish(shm_name, size, clean_text, style, panel_index):
+    """Decode the raw panel from shared memory (or draw the fallback when there is
+    none), caption it and publish it. Returns the URL and {stage: seconds}, since
+    metrics recorded in this process would never reach /metrics"""
+    if shm_name is None:
+        image = _assets.fallback_background(style, panel_index)
+    else:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            with shm.buf[:size] as raw:
+                image = Image.open(BytesIO(raw))
+                image.load()
+        finally:
+            shm.close()
+
+    start = time.perf_counter()
+    image = _assets.caption(image, clean_text)
+    captioned = time.perf_counter()
+    url = image_store.store(image)
+    return url, {"add_speech_bubble": captioned - start, "image_encode": time.perf_counter() - captioned}
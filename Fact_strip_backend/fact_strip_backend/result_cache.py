@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import string
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from metrics import log
+from sqlite_connections import SqliteConnections
+
+
+def normalize_statement(statement):
+    """Normalize a statement so trivially different submissions share a cache key"""
+    text = unicodedata.normalize("NFKC", statement).casefold()
+    # Drop punctuation (ASCII and unicode) and collapse whitespace
+    text = "".join(" " if unicodedata.category(ch).startswith("P") or ch in string.punctuation else ch
+                   for ch in text)
+    return " ".join(text.split())
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteCacheBackend:
+    """On-disk LRU shared by every worker process pointing at the same file"""
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._connections = SqliteConnections(path)
+        with self._connections.get() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_access ON result_cache(last_access)")
+
+    def get(self, key):
+        now = time.time()
+        with self._connections.get() as conn:
+            row = conn.execute("SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE result_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._connections.get() as conn:
+            conn.execute("INSERT OR REPLACE INTO result_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                         (key, value, now + ttl, now))
+            conn.execute("DELETE FROM result_cache WHERE expires_at < ?", (now,))
+            conn.execute("""DELETE FROM result_cache WHERE key IN (
+                SELECT key FROM result_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )""", (self.max_entries,))
+
+    def __len__(self):
+        return self._connections.get().execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+
+class ResultCache:
+    def __init__(self, backend=None, ttl=86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @property
+    def shared(self):
+        """Whether other worker processes on the host see the same entries"""
+        return isinstance(self.backend, SqliteCacheBackend)
+
+    def make_key(self, statement, style):
+        normalized = normalize_statement(statement)
+        return hashlib.sha256(f"{style}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, statement, style):
+        """Return the stored result dict, or None on a miss"""
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(self.make_key(statement, style))
+        except Exception as e:
+            log(f"❌ Result cache read error: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return json.loads(value) if value is not None else None
+
+    def set(self, statement, style, result):
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(self.make_key(statement, style), json.dumps(result), self.ttl)
+        except Exception as e:
+            log(f"❌ Result cache write error: {e}")
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.backend) if self.enabled else 0
+        }
+
+
+def _create_result_cache():
+    backend_name = os.getenv("RESULT_CACHE_BACKEND", "memory")
+    max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+    if backend_name == "sqlite":
+        backend = SqliteCacheBackend(os.getenv("RESULT_CACHE_PATH", "result_cache.db"), max_entries)
+    elif backend_name == "memory":
+        backend = MemoryCacheBackend(max_entries)
+    else:
+        backend = None  # "off"
+    return ResultCache(backend, ttl=float(os.getenv("RESULT_CACHE_TTL", "86400")))
+
+
+# Create global instance
+result_cache = _create_result_cache()
@@ -0,0 +1,202 @@
+import asyncio
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-worker locking
+    fcntl = None
+
+from metrics import metrics, log
+from result_cache import result_cache
+
+
+class FlightTimeout(Exception):
+    """A follower gave up waiting for the leader"""
+
+
+class Flight:
+    """One call in progress: the events it has published so far, then its result or error"""
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.result = None
+        self.error = None
+        self._changed = threading.Condition()
+
+    def publish(self, name, data):
+        with self._changed:
+            self.events.append((name, data))
+            self._changed.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self._changed:
+            self.finished = True
+            self.result = result
+            self.error = error
+            self._changed.notify_all()
+
+    def follow(self, on_event, timeout):
+        """Replay the leader's events to on_event as they happen, then return its result"""
+        deadline = time.monotonic() + timeout
+        seen = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: len(self.events) > seen or self.finished,
+                                       timeout=max(0, deadline - time.monotonic()))
+                events = self.events[seen:]
+                finished = self.finished
+            for name, data in events:
+                on_event(name, data)
+            seen += len(events)
+            if finished and seen == len(self.events):
+                if self.error is not None:
+                    raise self.error
+                return self.result
+            if not events and time.monotonic() >= deadline:
+                raise FlightTimeout(f"no result after {timeout:.0f}s")
+
+
+class SingleFlight:
+    """Lets concurrent identical calls share one execution.
+
+    The first caller for a key is the leader and runs the work; callers that
+    arrive while it is running follow it, receiving its events as they happen
+    and then its result or its exception. Followers that time out or are
+    cancelled just stop listening, the leader carries on for everyone else.
+
+    With lock_dir set, leaders in different worker processes also take a per-key
+    lock file, so only one worker runs a given key at a time and the others
+    find its result in the shared result cache once the lock is released. That
+    needs shared_cache: with a per-process cache the waiting worker would only
+    run the whole request again, so lock_dir is ignored without one.
+    """
+
+    def __init__(self, timeout=300, lock_dir=None, shared_cache=False):
+        self.timeout = timeout
+        self.lock_dir = lock_dir if fcntl is not None and shared_cache else None
+        if lock_dir and fcntl is None:
+            log("⚠️ SINGLE_FLIGHT_LOCK_DIR needs fcntl, coalescing stays per-process")
+        elif lock_dir and not shared_cache:
+            log("⚠️ SINGLE_FLIGHT_LOCK_DIR needs RESULT_CACHE_BACKEND=sqlite, coalescing stays per-process")
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._flights = {}
+        self._tasks = {}  # key -> asyncio task, for the ASGI app's event loop
+        self._lock = threading.Lock()
+
+    def run(self, key, fn, on_event=None):
+        """fn(on_event) once per key at a time, returns (result, followed)"""
+        emit = on_event or (lambda name, data: None)
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = Flight()
+
+        if not is_leader:
+            log("🔗 Joined an identical request already in flight")
+            metrics.coalesced.inc(scope="thread")
+            return flight.follow(emit, self.timeout), True
+
+        def publish(name, data):
+            flight.publish(name, data)
+            emit(name, data)
+
+        try:
+            result = fn(publish)
+        except Exception as e:
+            flight.finish(error=e)
+            raise
+        else:
+            flight.finish(result=result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    async def run_async(self, key, make_coroutine):
+        """run() for coroutines: followers await the leader's task"""
+        task = self._tasks.get(key)
+        followed = task is not None
+        if not followed:
+            task = self._tasks[key] = asyncio.ensure_future(make_coroutine())
+            task.add_done_callback(lambda done: self._task_done(key, done))
+        else:
+            log("🔗 Joined an identical request already in flight")
+            metrics.coalesced.inc(scope="thread")
+        # Shielded: a caller that disconnects doesn't cancel the work for the others
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout), followed
+        except asyncio.TimeoutError:
+            raise FlightTimeout(f"no result after {self.timeout:.0f}s")
+
+    def _task_done(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # every waiter may have gone, don't warn about it being unretrieved
+
+    def process_lock(self, key):
+        """The cross-worker lock for key, a no-op without lock_dir"""
+        return ProcessLock(os.path.join(self.lock_dir, f"{key}.lock") if self.lock_dir else None, self.timeout)
+
+
+class ProcessLock:
+    """An exclusive flock on a lock file, shared by every worker on the host"""
+
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self._handle = None
+
+    def acquire(self):
+        """Wait for the lock, up to timeout, then carry on without it"""
+        if self.path is None:
+            return
+        handle = open(self.path, "a+")
+        waited = False
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._handle = handle
+                return
+            except BlockingIOError:
+                if not waited:
+                    log("🔗 Another worker is running this request, waiting for it")
+                    metrics.coalesced.inc(scope="process")
+                    waited = True
+                if time.monotonic() >= deadline:
+                    log("⏰ Gave up waiting for the other worker")
+                    handle.close()
+                    return
+                time.sleep(0.05)
+
+    def release(self):
+        if self._handle is None:
+            return
+        try:
+            # At worst a worker still queued on the old file runs alongside a new one
+            os.unlink(self.path)
+        except OSError:
+            pass
+        self._handle.close()
+        self._handle = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+# Create global instance
+single_flight = SingleFlight(
+    timeout=float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "300")),
+    lock_dir=os.getenv("SINGLE_FLIGHT_LOCK_DIR") or None,
+    shared_cache=result_cache.shared
+)
@@ -0,0 +1,23 @@
+import sqlite3
+import threading
+
+
+class SqliteConnections:
+    """One WAL-mode connection per thread to a sqlite file (connections can't be shared across threads)"""
+
+    def __init__(self, path, row_factory=None, timeout=10):
+        self.path = path
+        self.row_factory = row_factory
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# The backend modules import each other by bare name, as they do under `python app.py`
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fact_strip_backend"))
+
+# Modules create their stores on import, keep them out of the working tree
+_scratch = tempfile.mkdtemp(prefix="factstrip_tests_")
+os.environ.setdefault("HISTORY_DB_PATH", os.path.join(_scratch, "history.db"))
+os.environ.setdefault("IMAGE_STORE_DIR", os.path.join(_scratch, "image_store"))
+os.environ.setdefault("PANEL_CACHE_DIR", os.path.join(_scratch, "panel_cache"))
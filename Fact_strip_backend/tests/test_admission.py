@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def make_controller(**settings):
+    defaults = dict(max_active=1, max_queued=2, max_text_only=1,
+                    queue_timeouts={"interactive": 5.0, "batch": 5.0}, client_rate=0)
+    defaults.update(settings)
+    return AdmissionController(**defaults)
+
+
+def wait_in_thread(ticket):
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.setdefault("text_only", ticket.wait()))
+    thread.start()
+    return thread, outcome
+
+
+def test_runs_immediately_while_slots_are_free():
+    controller = make_controller(max_active=2)
+    first, second = controller.reserve(), controller.reserve()
+    assert (first.state, second.state) == ("active", "active")
+    assert first.wait() is False
+    assert controller.reserve().state == "queued"
+
+
+def test_queued_ticket_is_admitted_when_a_slot_frees():
+    controller = make_controller()
+    running = controller.reserve()
+    queued = controller.reserve()
+    thread, outcome = wait_in_thread(queued)
+
+    running.release()
+    thread.join(timeout=2)
+    assert outcome == {"text_only": False}
+    assert queued.state == "active"
+    assert controller.stats()["active"] == 1
+    queued.release()
+    assert controller.stats()["active"] == 0
+
+
+def test_interactive_is_admitted_before_earlier_batch():
+    controller = make_controller()
+    running = controller.reserve()
+    batch = controller.reserve(priority="batch")
+    interactive = controller.reserve(priority="interactive")
+
+    running.release()
+    assert interactive.state == "active"
+    assert batch.state == "queued"
+
+
+def test_full_queue_displaces_the_newest_batch_request():
+    controller = make_controller()
+    controller.reserve()
+    older_batch = controller.reserve(priority="batch")
+    newer_batch = controller.reserve(priority="batch")
+
+    interactive = controller.reserve(priority="interactive")
+    assert interactive.state == "queued"
+    assert newer_batch.state == "text_only"
+    assert newer_batch.wait() is True  # doesn't wait out its deadline
+    assert older_batch.state == "queued"
+    assert controller.stats()["queued"] == {"interactive": 1, "batch": 1}
+
+
+def test_batch_never_displaces_interactive():
+    controller = make_controller(max_text_only=1)
+    controller.reserve()
+    controller.reserve()
+    controller.reserve()
+    assert controller.reserve(priority="batch").state == "text_only"
+
+
+def test_queued_past_its_deadline_goes_text_only():
+    controller = make_controller(queue_timeouts={"interactive": 0.05})
+    running = controller.reserve()
+    queued = controller.reserve()
+
+    started = time.monotonic()
+    assert queued.wait() is True
+    assert time.monotonic() - started < 1
+    assert controller.stats()["text_only"] == 1
+
+    # A late release of the running ticket must not admit the expired one
+    running.release()
+    assert queued.state == "text_only"
+    queued.release()
+    assert (controller.stats()["active"], controller.stats()["text_only"]) == (0, 0)
+
+
+def test_rejects_with_503_once_queue_and_text_only_are_full():
+    controller = make_controller()
+    for _ in range(4):  # 1 active, 2 queued, 1 text-only
+        controller.reserve()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.reserve()
+    assert rejected.value.status == 503
+    assert rejected.value.retry_after >= 1
+
+
+def test_empty_token_bucket_is_429():
+    controller = make_controller(client_rate=1.0, client_burst=2)
+    controller.check_rate("10.0.0.1")
+    controller.check_rate("10.0.0.1")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check_rate("10.0.0.1")
+    assert rejected.value.status == 429
+    assert rejected.value.retry_after == 1
+    controller.check_rate("10.0.0.2")  # other clients have their own bucket
+
+
+def test_disabled_controller_admits_everything():
+    controller = make_controller(max_active=0)
+    tickets = [controller.reserve() for _ in range(20)]
+    assert {ticket.state for ticket in tickets} == {"unlimited"}
+    assert not any(ticket.wait() for ticket in tickets)
+
+
+def test_admit_releases_the_slot():
+    controller = make_controller()
+    with controller.admit() as text_only:
+        assert text_only is False
+        assert controller.stats()["active"] == 1
+    assert controller.stats()["active"] == 0
+
+    with pytest.raises(RuntimeError):
+        with controller.admit():
+            raise RuntimeError("pipeline failed")
+    assert controller.stats()["active"] == 0
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+from asgi import ThreadedWsgiToAsgi
+
+release_stream = threading.Event()
+
+
+def wsgi_app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    if environ["PATH_INFO"] == "/stream":
+        def stream():
+            yield b"first"
+            release_stream.wait(5)
+            yield b"last"
+        return stream()
+    return [b"fast"]
+
+
+async def call(app, path, on_body=None):
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": [], "server": ("test", 80), "client": ("127.0.0.1", 1234),
+             "scheme": "http", "http_version": "1.1"}
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            body.append(message["body"])
+            if on_body:
+                on_body()
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+def test_open_stream_does_not_block_other_routes():
+    app = ThreadedWsgiToAsgi(wsgi_app, max_threads=4)
+
+    async def scenario():
+        streaming = asyncio.Event()
+        stream = asyncio.create_task(call(app, "/stream", on_body=streaming.set))
+        await asyncio.wait_for(streaming.wait(), 2)
+        fast = await asyncio.wait_for(call(app, "/health"), 2)
+        assert not stream.done()
+        release_stream.set()
+        return fast, await asyncio.wait_for(stream, 2)
+
+    assert asyncio.run(scenario()) == (b"fast", b"firstlast")
+
+
+def test_progressive_rendering_keeps_generate_on_the_flask_route(monkeypatch):
+    import asgi
+    monkeypatch.setattr(asgi.comic_generator, "progressive", True)
+    assert not asgi.AsgiApp(wsgi_app).native_generate
+    monkeypatch.setattr(asgi.comic_generator, "progressive", False)
+    monkeypatch.setattr(asgi.fact_analyzer, "mode", "parallel")
+    assert asgi.AsgiApp(wsgi_app).native_generate
@@ -0,0 +1,50 @@
+import json
+
+import batch_processor
+from admission import admission
+from batch_processor import BatchProcessor
+
+
+def fake_run(statement, style, priority="interactive"):
+    return {"verdict": "False", "original_statement": statement, "text_only": "busy" in statement}
+
+
+def test_text_only_answers_are_not_ok(monkeypatch):
+    monkeypatch.setattr(batch_processor.fact_pipeline, "run", fake_run)
+    records = list(BatchProcessor(max_workers=2).process(
+        [{"statement": "Bees can fly"}, {"statement": "Server is busy"}, {"statement": ""}]))
+
+    statuses = {record["statement"]: record["status"] for record in records}
+    assert statuses == {"Bees can fly": "ok", "Server is busy": "text_only", "": "error"}
+
+
+def test_cli_runs_without_admission_limits(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(batch_processor.fact_pipeline, "run", fake_run)
+    monkeypatch.setattr(admission, "max_active", admission.max_active)  # restored after the test
+    source = tmp_path / "claims.jsonl"
+    source.write_text('"Bees can fly"\n"Server is busy"\n', encoding="utf-8")
+
+    assert batch_processor.main([str(source), "--workers", "2"]) == 1
+    assert not admission.enabled
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert sorted(record["status"] for record in records) == ["ok", "text_only"]
+
+
+def test_malformed_items_get_error_records(monkeypatch):
+    monkeypatch.setattr(batch_processor.fact_pipeline, "run", fake_run)
+    records = list(BatchProcessor(max_workers=2).process(
+        [42, None, ["Bees can fly"], {"statement": 5}, {"statement": "Bees can fly"}]))
+
+    assert sorted((record["index"], record["status"]) for record in records) == [
+        (0, "error"), (1, "error"), (2, "error"), (3, "error"), (4, "ok")]
+
+
+def test_non_object_jsonl_lines_become_error_records(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(batch_processor.fact_pipeline, "run", fake_run)
+    monkeypatch.setattr(admission, "max_active", admission.max_active)
+    source = tmp_path / "claims.jsonl"
+    source.write_text('"Bees can fly"\n42\nnull\n[1, 2]\n', encoding="utf-8")
+
+    assert batch_processor.main([str(source)]) == 1
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert sorted(record["status"] for record in records) == ["error", "error", "error", "ok"]
@@ -0,0 +1,76 @@
+import time
+
+from circuit_breaker import CircuitBreaker
+
+
+def make_breaker(**settings):
+    defaults = dict(window=10, min_calls=4, error_rate=0.5, slow_call_seconds=1.0,
+                    slow_call_rate=0.5, open_seconds=0.05, half_open_probes=1)
+    defaults.update(settings)
+    return CircuitBreaker("test", **defaults)
+
+
+def test_stays_closed_below_min_calls():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_opens_on_error_rate():
+    breaker = make_breaker()
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == "closed"
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.snapshot()["short_circuited"] == 1
+
+
+def test_opens_on_slow_call_rate():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record(True, 0.1)
+    for _ in range(2):
+        breaker.record(True, 5.0)
+    assert breaker.state == "open"
+
+
+def test_half_open_success_closes():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record(True, 0.1)
+    assert breaker.state == "closed"
+    assert breaker.snapshot()["recent_calls"] == 0
+
+
+def test_half_open_failure_or_slow_probe_reopens():
+    for succeeded, duration in ((False, 0.1), (True, 5.0)):
+        breaker = make_breaker()
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        time.sleep(0.06)
+        assert breaker.allow()
+        breaker.record(succeeded, duration)
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+
+def test_latency_percentile_needs_min_calls():
+    breaker = make_breaker()
+    for duration in (1, 2, 3):
+        breaker.record(True, duration)
+    assert breaker.latency_percentile(95) is None
+    for duration in (4, 5):
+        breaker.record(True, duration)
+    assert breaker.latency_percentile(95) == 5
+    assert breaker.latency_percentile(0) == 1
@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+from claim_index import ClaimIndex
+
+RESULT = {"verdict": "False", "panel_images": []}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ClaimIndex(str(tmp_path / "claims.db"))
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Covid vaccines are safe", "Covid vaccines are unsafe"),
+    ("Drinking water is healthy", "Drinking water is unhealthy"),
+    ("Humans use 10% of their brains", "Humans use 100% of their brains"),
+    ("Vitamin C cures colds", "Vitamin D cures colds"),
+    ("Coffee is dehydrating", "Coffee is hydrating"),
+    ("Exercise is effective against depression", "Exercise is ineffective against depression"),
+    ("The Great Wall of China is visible from space", "The Great Wall of China is not visible from space"),
+    ("Bats can see", "Bats can't see"),
+])
+def test_opposite_claims_never_match(index, stored, asked):
+    index.add(stored, "normal", RESULT)
+    assert index.lookup(asked, "normal") is None
+    index.add(asked, "normal", RESULT)
+    assert index.lookup(stored, "normal")["similar_to"] == stored
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Lightning never strikes the same place twice", "Lightning never strikes twice in the same place"),
+    ("Goldfish have a three second memory", "Goldfish only have a three second memory"),
+    ("The Great Wall of China is visible from space", "Is the Great Wall of China visible from space?"),
+    ("Humans use 10% of their brains", "Humans really only use 10 percent of their brains"),
+])
+def test_rewordings_match(index, stored, asked):
+    index.add(stored, "normal", RESULT)
+    match = index.lookup(asked, "normal")
+    assert match is not None
+    assert match["similar_to"] == stored
+    assert match["verdict"] == "False"
+
+
+def test_styles_are_separate(index):
+    index.add("Goldfish have a three second memory", "normal", RESULT)
+    assert index.lookup("Goldfish only have a three second memory", "manga") is None
+
+
+def test_old_signatures_are_rebuilt(tmp_path):
+    path = str(tmp_path / "claims.db")
+    ClaimIndex(path).add("Goldfish have a three second memory", "normal", RESULT)
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE claim_bands SET band_key = band_key + 1")
+        conn.execute("PRAGMA user_version = 1")
+
+    index = ClaimIndex(path)
+    assert index.lookup("Goldfish only have a three second memory", "normal") is not None
+
+
+def test_disabled_by_default(monkeypatch):
+    import claim_index
+    monkeypatch.delenv("CLAIM_INDEX_BACKEND", raising=False)
+    assert claim_index._create_claim_index() is None
+
+
+def test_stats_count_claims_without_scanning(tmp_path):
+    path = str(tmp_path / "claims.db")
+    index = ClaimIndex(path)
+    index.add("Goldfish have a three second memory", "normal", RESULT)
+    index.add("Goldfish have a three second memory", "normal", RESULT)  # already indexed
+    index.add("Bats are blind", "normal", RESULT)
+    assert index.stats()["claims"] == 2
+    assert ClaimIndex(path).stats()["claims"] == 2
+
+    # An index created before the counter existed starts from its current size
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE claim_count")
+    assert ClaimIndex(path).stats()["claims"] == 2
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import fact_pipeline as pipeline_module
+from comic_generator import comic_generator
+from fact_pipeline import fact_pipeline
+
+PANELS = ["one", "two", "three", "four"]
+
+
+def fake_render(panel_text, style, i, statement, tier):
+    if i == 1:
+        return None
+    if i == 2:
+        raise RuntimeError("replicate down")
+    if i == 3:
+        time.sleep(0.5)
+    return f"render-{i}"
+
+
+def test_panels_report_which_fell_back(monkeypatch):
+    monkeypatch.setattr(comic_generator, "panel_timeout", 0.2)
+    images, fell_back = comic_generator._generate_panels(
+        fake_render, lambda panel_text, style, i: f"fallback-{i}", "anime", PANELS, "claim", None)
+    assert images == ["render-0", "fallback-1", "fallback-2", "fallback-3"]
+    assert fell_back == {1, 2, 3}
+
+
+def test_failed_refine_keeps_the_preview_but_reports_it(monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("breaker open")
+    monkeypatch.setattr(comic_generator, "generate_comic_panels", broken)
+    preview = ["p0", "p1", "p2", "p3"]
+    assert fact_pipeline.generate_comic(PANELS, "anime", "claim", previous=preview) == (preview, {0, 1, 2, 3})
+
+
+@pytest.mark.parametrize("result, fell_back, cached", [
+    ({}, set(), True),
+    ({}, {2}, False),
+    ({"fallback": True}, set(), False),
+])
+def test_only_complete_responses_are_cached(monkeypatch, result, fell_back, cached):
+    stored = []
+    monkeypatch.setattr(pipeline_module.result_cache, "set", lambda *args: stored.append("cache"))
+    monkeypatch.setattr(pipeline_module, "claim_index", None)
+    monkeypatch.setattr(fact_pipeline, "_record_history", lambda response_data: stored.append("history"))
+    fact_pipeline._store("claim", "anime", result, {"panel_images": []}, fell_back)
+    assert stored == (["cache", "history"] if cached else ["history"])
+
+
+def test_cancelled_panels_never_render(monkeypatch):
+    cancel = threading.Event()
+    rendered = []
+
+    def render(panel_text, style, i, statement, tier):
+        rendered.append(i)
+        cancel.set()
+        return f"render-{i}"
+
+    monkeypatch.setattr(comic_generator, "_executor", ThreadPoolExecutor(max_workers=1))
+    _, fell_back = comic_generator._generate_panels(
+        render, lambda panel_text, style, i: f"fallback-{i}", "anime", PANELS, "claim", None, cancel=cancel)
+    assert rendered == [0]
+    assert fell_back == set()
+
+
+def test_early_comic_is_dropped_when_the_final_analysis_differs(monkeypatch):
+    streamed = {"verdict": "true", "confidence": 90, "story": "A streamed story. It has two sentences."}
+    final = dict(streamed, story="A different story. It also has two sentences.", description="Why.")
+
+    def analyze(statement, on_field=None):
+        for key, value in streamed.items():
+            on_field(key, value)
+        return json.dumps(final), "serious", 80
+
+    comics = []
+
+    def generate_comic(panels, style, statement, on_panel=None, tier="final", previous=None, cancel=None):
+        comics.append(cancel)
+        if cancel is not None:
+            cancel.wait(2)
+        return ["image"] * len(panels), set()
+
+    monkeypatch.setattr(pipeline_module.fact_analyzer, "mode", "streaming")
+    monkeypatch.setattr(pipeline_module.fact_analyzer, "analyze", analyze)
+    monkeypatch.setattr(fact_pipeline, "generate_comic", generate_comic)
+    monkeypatch.setattr(fact_pipeline, "_store", lambda *args: None)
+
+    response = fact_pipeline._run_uncoalesced("claim", "anime", lambda name, data: None)
+
+    assert response["story"] == final["story"]
+    # The regular comic was drawn, the early one was cancelled before or while it ran
+    assert None in comics
+    assert all(cancel.is_set() for cancel in comics if cancel is not None)
+    assert response["panel_images"] == ["image"] * 4
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from http_clients import HttpClients
+from metrics import metrics
+
+
+def hedges(outcome):
+    return metrics.hedges._values.get((("outcome", outcome),), 0)
+
+
+class FakeReplicate:
+    """Stands in for _run_limited: each call takes the next (delay, result) in order"""
+
+    def __init__(self, *calls):
+        self.calls = list(calls)
+        self.started = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, model, input_params):
+        with self._lock:
+            delay, result = self.calls[self.started]
+            self.started += 1
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture
+def clients():
+    clients = HttpClients()
+    yield clients
+    clients._hedge_executor.shutdown(wait=True)
+
+
+def test_fast_primary_sends_no_hedge(clients, monkeypatch):
+    fake = FakeReplicate((0.0, "primary"))
+    monkeypatch.setattr(clients, "_run_limited", fake)
+    launched = hedges("launched")
+
+    assert clients._run_hedged("model", {}, 0.5) == "primary"
+    assert fake.started == 1
+    assert hedges("launched") == launched
+
+
+def test_slow_primary_launches_hedge_that_wins(clients, monkeypatch):
+    fake = FakeReplicate((0.5, "primary"), (0.0, "hedge"))
+    monkeypatch.setattr(clients, "_run_limited", fake)
+    launched, won = hedges("launched"), hedges("won")
+
+    assert clients._run_hedged("model", {}, 0.05) == "hedge"
+    assert fake.started == 2
+    assert hedges("launched") == launched + 1
+    assert hedges("won") == won + 1
+
+
+def test_primary_can_still_win_after_hedge(clients, monkeypatch):
+    fake = FakeReplicate((0.1, "primary"), (0.5, "hedge"))
+    monkeypatch.setattr(clients, "_run_limited", fake)
+    won = hedges("won")
+
+    assert clients._run_hedged("model", {}, 0.05) == "primary"
+    assert fake.started == 2
+    assert hedges("won") == won
+
+
+def test_failed_prediction_falls_back_to_the_other(clients, monkeypatch):
+    fake = FakeReplicate((0.1, RuntimeError("primary failed")), (0.2, "hedge"))
+    monkeypatch.setattr(clients, "_run_limited", fake)
+    assert clients._run_hedged("model", {}, 0.05) == "hedge"
+
+
+def test_both_failing_raises_first_error(clients, monkeypatch):
+    fake = FakeReplicate((0.1, RuntimeError("primary failed")), (0.2, RuntimeError("hedge failed")))
+    monkeypatch.setattr(clients, "_run_limited", fake)
+    with pytest.raises(RuntimeError, match="primary failed"):
+        clients._run_hedged("model", {}, 0.05)
+
+
+def test_hedge_delay_follows_breaker_p95(clients, monkeypatch):
+    from circuit_breaker import CircuitBreaker
+    breaker = CircuitBreaker("test", min_calls=5)
+    monkeypatch.setattr(clients, "hedge_enabled", True)
+    monkeypatch.setattr(clients, "hedge_min_delay", 2.0)
+
+    assert clients._hedge_delay(breaker) is None  # not enough samples yet
+    for duration in (1, 1, 1, 1, 9):
+        breaker.record(True, duration)
+    assert clients._hedge_delay(breaker) == 9
+    breaker.state = "half_open"
+    assert clients._hedge_delay(breaker) is None
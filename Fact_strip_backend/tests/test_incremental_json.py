@@ -0,0 +1,74 @@
+import json
+import random
+
+import pytest
+
+from incremental_json import IncrementalJSONParser
+
+ANALYSIS = {
+    "verdict": "False",
+    "confidence": 92,
+    "description": "Goldfish remember things for months, not \"three seconds\".\nStudies: 1994, 2003.",
+    "story": ["Panel 1: a goldfish \\ a bowl", "Panel 2: ¿qué? 🐟", "Panel 3", "Panel 4"],
+    "sources": [{"title": "A {tricky} [title]", "year": 2003}, None],
+    "fallback": False,
+    "score": -1.5e-3,
+}
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(["string", "int", "float", "bool", "null"] + (["list", "object"] if depth < 3 else []))
+    if kind == "string":
+        return "".join(rng.choice('ab ,:{}[]"\\\n\té🐟') for _ in range(rng.randint(0, 12)))
+    if kind == "int":
+        return rng.randint(-10 ** 6, 10 ** 6)
+    if kind == "float":
+        return rng.uniform(-1e6, 1e6)
+    if kind == "bool":
+        return rng.random() < 0.5
+    if kind == "null":
+        return None
+    if kind == "list":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+def feed_in_chunks(text, rng):
+    parser = IncrementalJSONParser()
+    fields = []
+    pos = 0
+    while pos < len(text):
+        size = rng.choice([1, 1, 2, 3, rng.randint(1, 40)])
+        fields.extend(parser.feed(text[pos:pos + size]))
+        pos += size
+    return parser, fields
+
+
+def render(document, rng):
+    text = json.dumps(document, indent=rng.choice([None, 2]), ensure_ascii=rng.random() < 0.5,
+                      separators=rng.choice([None, (",", ":"), (" , ", " : ")]))
+    if rng.random() < 0.3:
+        text = "```json\n" + text + "\n```"
+    return text
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_chunks_match_json_loads(seed):
+    rng = random.Random(seed)
+    document = ANALYSIS if seed % 4 == 0 else {f"field{i}": random_value(rng) for i in range(rng.randint(0, 8))}
+    text = render(document, rng)
+
+    parser, fields = feed_in_chunks(text, rng)
+
+    assert parser.done
+    assert [key for key, _ in fields] == list(document)
+    assert dict(fields) == json.loads(json.dumps(document))
+
+
+def test_fields_arrive_as_soon_as_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"verdict": "Fal') == []
+    assert parser.feed('se", "confidence": 9') == [("verdict", "False")]
+    assert parser.feed("2, ") == [("confidence", 92)]
+    assert parser.feed('"story": ["a"]}') == [("story", ["a"])]
+    assert parser.done
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+import app
+import job_queue
+from admission import admission, AdmissionRejected
+from job_queue import JobManager
+
+
+@pytest.fixture
+def blocked_pipeline(monkeypatch):
+    """fact_pipeline.run blocks until the returned event is set"""
+    release = threading.Event()
+
+    def run(statement, style, on_event=None):
+        release.wait(5)
+        return {"statement": statement}
+
+    monkeypatch.setattr(job_queue.fact_pipeline, "run", run)
+    yield release
+    release.set()
+
+
+def test_submit_rejects_once_the_backlog_is_full(blocked_pipeline):
+    manager = JobManager(max_workers=1, max_backlog=1, retry_after=7)
+    jobs = [manager.submit("Bees can fly", "normal"), manager.submit("Cats can fly", "normal")]
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        manager.submit("Dogs can fly", "normal")
+    assert (rejected.value.status, rejected.value.retry_after) == (503, 7)
+
+    blocked_pipeline.set()
+    assert all(job.wait(timeout=2) for job in jobs)
+    assert manager.submit("Dogs can fly", "normal").wait(timeout=2)
+
+
+def test_generate_hands_over_the_job_after_its_deadline(monkeypatch, blocked_pipeline):
+    monkeypatch.setattr(app, "GENERATE_WAIT_TIMEOUT", 0.1)
+    monkeypatch.setattr(admission, "client_rate", 0)
+
+    response = app.app.test_client().post("/api/generate", json={"statement": "Bees can fly"})
+
+    assert response.status_code == 202
+    assert response.json["status_url"] == f"/api/jobs/{response.json['job_id']}"
@@ -0,0 +1,37 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from metrics import metrics, request_spans, start_request
+from render_pool import RenderPool
+
+ASSETS = dict(panel_width=256, panel_height=256, bg_colors={"normal": (235, 245, 255)})
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    # Spawned workers read the image store settings from the environment they inherit
+    monkeypatch.setenv("IMAGE_STORE_DIR", str(tmp_path))
+    pool = RenderPool(1, ASSETS)
+    yield pool
+    pool.shutdown()
+
+
+def stage_count(stage):
+    return metrics.stage_seconds.totals().get((("stage", stage),), (0, 0))[0]
+
+
+def test_worker_stages_are_recorded_in_the_parent(pool):
+    raw = BytesIO()
+    Image.new("RGB", (300, 300), "red").save(raw, "PNG")
+    before = {stage: stage_count(stage) for stage in ("add_speech_bubble", "image_encode", "render_worker")}
+    start_request()
+
+    assert pool.caption_and_publish(raw.getvalue(), "Hello", "normal", 0).startswith("/api/images/")
+    assert pool.caption_and_publish(None, "Fallback", "normal", 1).startswith("/api/images/")
+
+    for stage, count in before.items():
+        assert stage_count(stage) == count + 2
+    assert [stage for stage, _ in request_spans()] == ["render_worker", "add_speech_bubble", "image_encode"] * 2
+
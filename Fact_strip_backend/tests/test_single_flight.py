@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from single_flight import FlightTimeout, SingleFlight
+
+
+def start_leader(flights, key, fn):
+    """Run fn as the leader on a thread, returns (thread, outcome dict) once it's in flight"""
+    started = threading.Event()
+    outcome = {}
+
+    def leader_fn(publish):
+        started.set()
+        return fn(publish)
+
+    def run():
+        try:
+            outcome["result"] = flights.run(key, leader_fn)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(2)
+    return thread, outcome
+
+
+def test_follower_replays_events_and_gets_the_result():
+    flights = SingleFlight(timeout=5)
+    release = threading.Event()
+
+    def work(publish):
+        publish("analysis", {"verdict": "true"})
+        release.wait(2)
+        publish("panel", {"index": 0})
+        return {"success": True}
+
+    leader, outcome = start_leader(flights, "key", work)
+    events = []
+    threading.Timer(0.1, release.set).start()
+    result = flights.run("key", lambda publish: pytest.fail("follower ran the work"),
+                         lambda name, data: events.append((name, data)))
+    leader.join(2)
+
+    assert result == ({"success": True}, True)
+    assert outcome["result"] == ({"success": True}, False)
+    assert events == [("analysis", {"verdict": "true"}), ("panel", {"index": 0})]
+
+
+def test_leader_error_reaches_followers():
+    flights = SingleFlight(timeout=5)
+    release = threading.Event()
+
+    def work(publish):
+        release.wait(2)
+        raise ValueError("openai down")
+
+    leader, outcome = start_leader(flights, "key", work)
+    threading.Timer(0.1, release.set).start()
+    with pytest.raises(ValueError, match="openai down"):
+        flights.run("key", lambda publish: None)
+    leader.join(2)
+    assert isinstance(outcome["error"], ValueError)
+
+
+def test_follower_times_out_while_the_leader_carries_on():
+    flights = SingleFlight(timeout=0.1)
+    release = threading.Event()
+    leader, outcome = start_leader(flights, "key", lambda publish: release.wait(2) and "done")
+
+    with pytest.raises(FlightTimeout):
+        flights.run("key", lambda publish: None)
+    release.set()
+    leader.join(2)
+    assert outcome["result"] == ("done", False)
+
+
+def test_finished_flights_are_removed():
+    def boom(publish):
+        raise RuntimeError("boom")
+
+    flights = SingleFlight(timeout=5)
+    assert flights.run("ok", lambda publish: 1) == (1, False)
+    with pytest.raises(RuntimeError):
+        flights.run("failed", boom)
+    assert flights._flights == {}
+    # A new call for a finished key leads again instead of following the old flight
+    assert flights.run("ok", lambda publish: 2) == (2, False)
+
+
+def test_lock_dir_needs_a_shared_result_cache(tmp_path):
+    assert SingleFlight(lock_dir=str(tmp_path), shared_cache=False).process_lock("key").path is None
+    assert SingleFlight(lock_dir=str(tmp_path), shared_cache=True).process_lock("key").path is not None